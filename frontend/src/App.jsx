@@ -125,10 +125,8 @@ function App() {
         credentials: 'include'
       })
       const data = await response.json()
-      if (data.success) {
-        // Refresh accounts after a short delay to see updated status
-        setTimeout(fetchAccounts, 2000)
-      } else if (response.status === 401) {
+      // Status updates arrive through the event stream
+      if (!data.success && response.status === 401) {
         setIsAuthenticated(false)
       }
     } catch (error) {
@@ -168,13 +166,42 @@ function App() {
     setAccounts([])
   }
 
-  // Auto-refresh accounts when authenticated
+  // Apply a status change pushed by the server
+  const applyStatusEvent = (event) => {
+    const change = JSON.parse(event.data)
+    setAccounts((current) => current.map((account) => (
+      account.id === change.account_id
+        ? { ...account, status: change.status, last_login: change.last_login, updated_at: change.updated_at }
+        : account
+    )))
+  }
+
+  // Load accounts and follow status changes via server-sent events
   useEffect(() => {
     if (isAuthenticated) {
       fetchAccounts()
-      // Auto-refresh every 30 seconds
-      const interval = setInterval(fetchAccounts, 30000)
-      return () => clearInterval(interval)
+      const events = new EventSource('/api/accounts/events', { withCredentials: true })
+      events.addEventListener('status', applyStatusEvent)
+      // New accounts arrive one event per batch; an import sends several in a row,
+      // so wait for them to settle and load the list once
+      let reloadTimer = null
+      events.addEventListener('created', () => {
+        clearTimeout(reloadTimer)
+        reloadTimer = setTimeout(fetchAccounts, 1000)
+      })
+      events.addEventListener('deleted', (event) => {
+        const change = JSON.parse(event.data)
+        setAccounts((current) => current.filter((account) => account.id !== change.account_id))
+      })
+      // Missed events could not be replayed; reload the full list
+      events.addEventListener('reset', fetchAccounts)
+      // Slow safety net in case the stream is blocked by a proxy
+      const interval = setInterval(fetchAccounts, 300000)
+      return () => {
+        events.close()
+        clearInterval(interval)
+        clearTimeout(reloadTimer)
+      }
     }
   }, [isAuthenticated])
 
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn runs from the repo root:
+
+    gunicorn src.wsgi:app
+
+The deployment is ONE web process. The sync queue, its job ids, the
+adaptive limiter, the circuit breaker, the account scheduler and the
+/api/accounts/events bus all live in process memory and are not shared
+between workers. Concurrency comes from threads instead: every open
+EventSource holds one of them for as long as the dashboard is open.
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', '32'))
+
+
+def when_ready(server):
+    # -w on the command line overrides the setting above; a second process
+    # would get its own queue, scheduler and event bus, so refuse it here as well
+    if server.num_workers != 1:
+        server.log.warning("Only one worker process is supported (got %s); "
+                           "use --threads for concurrency", server.num_workers)
+        server.num_workers = 1
+    if server.cfg.worker_class_str == 'sync':
+        server.log.warning("The sync worker class serves one request at a time and every "
+                           "event stream blocks it; use gthread or gevent")
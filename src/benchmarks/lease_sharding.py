@@ -0,0 +1,189 @@
+"""
+Multi-process check of account leases (see services/account_leases).
+
+Starts several scheduler processes against one throwaway database. Every
+account is due, and each process syncs the accounts it manages to lease
+with a fake login. Every login is logged with its process and
+time span. At the end the script checks two things. All accounts must be
+synced. No account may ever have been synced by two processes at once.
+
+    python -m src.benchmarks.lease_sharding --accounts 300 --processes 4
+    python -m src.benchmarks.lease_sharding --kill-after 0.5
+    python -m src.benchmarks.lease_sharding --database-url postgresql://...
+
+--kill-after SIGKILLs the first process mid-run. Its accounts must be
+taken over by the others once its leases expire (--lease-ttl).
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+
+class FakeManusService:
+    latency = 0.0
+    log_path = None
+
+    def refresh_session(self, email, password, old_session_data=None):
+        started = time.time()
+        if self.latency:
+            time.sleep(self.latency)
+        with open(self.log_path, 'a') as log:
+            log.write(json.dumps({'email': email, 'pid': os.getpid(),
+                                  'start': started, 'end': time.time()}) + '\n')
+        return True, {'cookies': [{'name': 'sid', 'value': email}]}, "Login successful"
+
+
+def make_app(url):
+    from flask import Flask
+    from src.db_config import configure_database
+    from src.migrations import run_migrations
+
+    app = Flask(__name__)
+    configure_database(app, url)
+    with app.app_context():
+        run_migrations()
+    return app
+
+
+def child(args):
+    """One scheduler instance: sync due accounts until none is left"""
+    from src.models.user import db
+    from src.models.account import ManusAccount
+    from src.services.scheduler import AccountScheduler
+
+    FakeManusService.latency = args.latency_ms / 1000
+    FakeManusService.log_path = args.log
+    app = make_app(args.database_url)
+    scheduler = AccountScheduler(app, max_workers=args.workers)
+    scheduler.engine.service_factory = FakeManusService
+
+    def unsynced():
+        with app.app_context():
+            count = ManusAccount.query.filter(ManusAccount.status != 'active').count()
+            db.session.rollback()
+            return count
+
+    scheduler.rescan()
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        due_ids = scheduler.pop_due()
+        if due_ids:
+            scheduler.sync_accounts(due_ids)
+            continue
+        if not unsynced():
+            break
+        # Accounts leased by a peer come back once its lease could have expired
+        time.sleep(min(0.2, scheduler.seconds_until_next() or 0.2))
+    scheduler.leases.stop()
+
+
+def run(args):
+    from src.models.user import db
+    from src.models.account import ManusAccount
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'leases.db')}"
+        log_path = os.path.join(tmp, 'logins.jsonl')
+        open(log_path, 'w').close()
+
+        app = make_app(url)
+        with app.app_context():
+            db.session.query(ManusAccount).delete()
+            for i in range(args.accounts):
+                account = ManusAccount(email=f"lease{i}@example.com", status='inactive')
+                account.set_password('secret')
+                db.session.add(account)
+            db.session.commit()
+
+        env = dict(os.environ, SYNC_LEASE_TTL=str(args.lease_ttl), SYNC_LEASE_RENEW=str(args.lease_ttl / 4),
+                   SYNC_CHUNK_SIZE=str(args.chunk_size), SYNC_LOG_LEVEL='WARNING')
+        command = [sys.executable, '-m', 'src.benchmarks.lease_sharding', '--child',
+                   '--database-url', url, '--log', log_path, '--workers', str(args.workers),
+                   '--latency-ms', str(args.latency_ms), '--timeout', str(args.timeout)]
+        started = time.monotonic()
+        processes = [subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL)
+                     for _ in range(args.processes)]
+        killed = None
+        if args.kill_after is not None:
+            time.sleep(args.kill_after)
+            processes[0].send_signal(signal.SIGKILL)
+            killed = processes[0].pid
+        for process in processes:
+            process.wait()
+        elapsed = time.monotonic() - started
+
+        with app.app_context():
+            unsynced = ManusAccount.query.filter(ManusAccount.status != 'active').count()
+            still_leased = ManusAccount.query.filter(ManusAccount.lease_owner.isnot(None)).count()
+            db.session.remove()
+            db.engine.dispose()
+
+        logins = defaultdict(list)
+        per_process = defaultdict(int)
+        with open(log_path) as log:
+            for line in log:
+                entry = json.loads(line)
+                logins[entry['email']].append(entry)
+                per_process[entry['pid']] += 1
+
+    overlaps = 0
+    for entries in logins.values():
+        entries.sort(key=lambda entry: entry['start'])
+        for previous, current in zip(entries, entries[1:]):
+            if current['pid'] != previous['pid'] and current['start'] < previous['end']:
+                overlaps += 1
+
+    return {
+        'url': url.split('://')[0],
+        'accounts': args.accounts,
+        'processes': args.processes,
+        'killed_pid': killed,
+        'elapsed_s': round(elapsed, 3),
+        'logins': sum(per_process.values()),
+        'logins_per_process': sorted(per_process.values(), reverse=True),
+        'accounts_synced_twice': sum(1 for entries in logins.values() if len(entries) > 1),
+        'concurrent_overlaps': overlaps,
+        'unsynced_accounts': unsynced,
+        'leases_left': still_leased
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=300)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4, help='sync workers per process')
+    parser.add_argument('--chunk-size', type=int, default=10)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='fake login latency per account')
+    parser.add_argument('--lease-ttl', type=float, default=2.0)
+    parser.add_argument('--kill-after', type=float, help='SIGKILL the first process after this many seconds')
+    parser.add_argument('--timeout', type=float, default=60.0, help='give up after this many seconds')
+    parser.add_argument('--database-url', help='throwaway database of another engine; its accounts are replaced')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--log', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    result = run(args)
+    ok = result['concurrent_overlaps'] == 0 and result['unsynced_accounts'] == 0
+    if args.json:
+        print(json.dumps(dict(result, ok=ok)))
+    else:
+        for key, value in result.items():
+            print(f"{key:>22}: {value}")
+        print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Page-weight benchmark for request blocking.
+
+Loads a page repeatedly in headless Chrome with request blocking off and
+on, with the HTTP cache disabled so every load is cold, and reports the
+resources fetched, bytes transferred and load time for each.
+
+    python -m src.benchmarks.page_weight
+    python -m src.benchmarks.page_weight --url https://manus.chat/login --loads 10
+
+Needs Chrome and chromedriver. The blocking policy comes from the usual
+MANUS_BLOCK_* environment variables.
+"""
+import json
+import time
+import argparse
+from src.services.driver_pool import build_chrome_options
+from src.services.manus_service import LOGIN_URL
+from src.services.resource_blocking import BlockPolicy, RequestBlocker, page_weight
+
+
+def measure(url, loads, policy):
+    from selenium import webdriver
+
+    driver = webdriver.Chrome(options=build_chrome_options(headless=True))
+    try:
+        RequestBlocker(driver, policy).install()
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': True})
+        samples = []
+        for _ in range(loads):
+            driver.get('about:blank')
+            started = time.perf_counter()
+            driver.get(url)
+            elapsed = time.perf_counter() - started
+            weight = page_weight(driver) or {}
+            weight['wall_ms'] = elapsed * 1000
+            samples.append(weight)
+    finally:
+        driver.quit()
+
+    def mean(key):
+        values = [sample.get(key) or 0 for sample in samples]
+        return sum(values) / len(values) if values else 0.0
+
+    return {
+        'blocking': 'on' if policy.enabled else 'off',
+        'loads': loads,
+        'resources': round(mean('resources'), 1),
+        'transfer_kb': round(mean('transfer_bytes') / 1024, 1),
+        'load_ms': round(mean('load_ms'), 1),
+        'wall_ms': round(mean('wall_ms'), 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=LOGIN_URL)
+    parser.add_argument('--loads', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print one JSON object per mode')
+    args = parser.parse_args()
+
+    policy = BlockPolicy.from_env()
+    policy.enabled = True
+    results = [
+        measure(args.url, args.loads, BlockPolicy(enabled=False)),
+        measure(args.url, args.loads, policy)
+    ]
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    print(f"{args.url} ({args.loads} cold loads each)")
+    print(f"{'blocking':<10}{'resources':>10}{'transfer_kb':>13}{'load_ms':>10}{'wall_ms':>10}")
+    for result in results:
+        print(f"{result['blocking']:<10}{result['resources']:>10}{result['transfer_kb']:>13}"
+              f"{result['load_ms']:>10}{result['wall_ms']:>10}")
+    off, on = results
+    if off['transfer_kb']:
+        saved = 100 * (off['transfer_kb'] - on['transfer_kb']) / off['transfer_kb']
+        print(f"saved {off['transfer_kb'] - on['transfer_kb']:.1f} KB per load ({saved:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+"""
+Local stand-in for manus.chat used by the offline benchmarks.
+
+StubManusSite is a small threaded HTTP server with the pages ManusService
+relies on: a login form, a redirect to /app on success, an error message
+on bad credentials and a cookie-protected dashboard. Latency, jitter and
+an upstream error rate are configurable, so throughput can be measured
+without touching the real site.
+
+FakeWebDriver implements the slice of the Selenium WebDriver API that
+ManusService and DriverPool use. It talks HTTP to the stub site, so it can
+stand in for Chrome when only the sync machinery is being measured; a real
+Chrome can be pointed at the same site instead.
+"""
+import re
+import time
+import random
+import secrets
+import threading
+from html import escape
+from http.cookies import SimpleCookie
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urljoin, urlsplit, urlencode
+import urllib3
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+
+SESSION_COOKIE = 'manus_session'
+
+LOGIN_PAGE = """<!doctype html>
+<html><head><title>Login - Manus</title></head>
+<body>
+<form method="post" action="/login">
+  <input type="email" name="email" placeholder="Email">
+  <input type="password" name="password" placeholder="Password">
+  <button type="submit">Login</button>
+</form>
+{error}
+</body></html>"""
+
+APP_PAGE = """<!doctype html>
+<html><head><title>Manus</title></head>
+<body><div class="dashboard"><span class="user-menu">{email}</span></div></body></html>"""
+
+ERROR_MARKUP = '<div class="error">{message}</div>'
+
+
+class StubManusSite:
+    """Threaded HTTP server imitating the manus.chat login flow"""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, session_ttl=7 * 24 * 3600,
+                 valid_password='secret', host='127.0.0.1', port=0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.valid_password = valid_password
+        self.random = random.Random(seed)
+        self.sessions = {}  # token -> (email, expiry)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-site', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def issue_session(self, email):
+        """Create a server-side session and return it as a Selenium-style cookie"""
+        token = secrets.token_hex(16)
+        expiry = int(time.time() + self.session_ttl)
+        with self._lock:
+            self.sessions[token] = (email, expiry)
+        return {'name': SESSION_COOKIE, 'value': token, 'path': '/',
+                'domain': urlsplit(self.url).hostname, 'expiry': expiry,
+                'secure': False, 'httpOnly': True}
+
+    def session_email(self, token):
+        with self._lock:
+            session = self.sessions.get(token)
+        if session and session[1] > time.time():
+            return session[0]
+        return None
+
+    def _delay(self):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_ms + (self.random.uniform(-1, 1) * self.jitter_ms if self.jitter_ms else 0)
+            fail = self.error_rate and self.random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+    def _handler_class(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body='', headers=None):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _session_email(self):
+                cookie = SimpleCookie(self.headers.get('Cookie', ''))
+                morsel = cookie.get(SESSION_COOKIE)
+                return site.session_email(morsel.value) if morsel else None
+
+            def do_GET(self):
+                if site._delay():
+                    return self._send(503, LOGIN_PAGE.format(
+                        error=ERROR_MARKUP.format(message='Service temporarily unavailable')))
+                path = urlsplit(self.path).path
+                email = self._session_email()
+                if path == '/login':
+                    if email:
+                        return self._send(302, headers={'Location': '/app'})
+                    return self._send(200, LOGIN_PAGE.format(error=''))
+                if path in ('/', '/app'):
+                    if not email:
+                        return self._send(302, headers={'Location': '/login'})
+                    return self._send(200, APP_PAGE.format(email=escape(email)))
+                return self._send(404, 'Not found')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                form = parse_qs(self.rfile.read(length).decode())
+                if site._delay():
+                    return self._send(503, LOGIN_PAGE.format(
+                        error=ERROR_MARKUP.format(message='Service temporarily unavailable')))
+                if urlsplit(self.path).path != '/login':
+                    return self._send(404, 'Not found')
+
+                email = (form.get('email') or [''])[0]
+                password = (form.get('password') or [''])[0]
+                if not email or password != site.valid_password:
+                    return self._send(200, LOGIN_PAGE.format(
+                        error=ERROR_MARKUP.format(message='Invalid email or password')))
+
+                cookie = site.issue_session(email)
+                return self._send(302, headers={
+                    'Location': '/app',
+                    'Set-Cookie': f"{SESSION_COOKIE}={cookie['value']}; Path=/; "
+                                  f"Max-Age={int(site.session_ttl)}; HttpOnly"
+                })
+
+        return Handler
+
+
+# Enough CSS for the selectors ManusService uses: tag, .class, [attr=v], [attr*=v i]
+_SELECTOR_PATTERN = re.compile(
+    r"^(?P<tag>[a-z]+)?(?:\.(?P<cls>[\w-]+))?"
+    r"(?:\[(?P<attr>[\w-]+)(?P<op>\*?=)['\"](?P<value>[^'\"]*)['\"](?P<ci>\s+i)?\])?$"
+)
+_ELEMENT_PATTERN = re.compile(r'<(input|button|div|span|form)\b([^>]*)>(?:([^<]*))?', re.IGNORECASE)
+_ATTR_PATTERN = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+class FakeElement:
+    def __init__(self, driver, tag, attrs, text):
+        self.driver = driver
+        self.tag_name = tag
+        self.attrs = attrs
+        self.text = text.strip()
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+    def is_displayed(self):
+        return True
+
+    def clear(self):
+        self.driver._form.pop(self.attrs.get('name'), None)
+
+    def send_keys(self, value):
+        name = self.attrs.get('name')
+        self.driver._form[name] = self.driver._form.get(name, '') + value
+
+    def click(self):
+        if self.tag_name == 'button' and self.attrs.get('type') == 'submit':
+            self.driver._submit()
+
+    def _matches(self, selector):
+        match = _SELECTOR_PATTERN.match(selector.strip())
+        if not match:
+            return False
+        if match.group('tag') and match.group('tag') != self.tag_name:
+            return False
+        if match.group('cls') and match.group('cls') not in self.attrs.get('class', '').split():
+            return False
+        if match.group('attr'):
+            actual = self.attrs.get(match.group('attr'))
+            if actual is None:
+                return False
+            expected = match.group('value')
+            if match.group('ci'):
+                actual, expected = actual.lower(), expected.lower()
+            if match.group('op') == '*=':
+                return expected in actual
+            return actual == expected
+        return True
+
+
+class FakeWebDriver:
+    """Selenium-compatible driver that browses the stub site over plain HTTP"""
+
+    def __init__(self, http=None):
+        self.http = http or urllib3.PoolManager(maxsize=1, retries=False)
+        self.current_url = 'about:blank'
+        self.page_source = ''
+        self.window_handles = ['main']
+        self._cookies = {}  # name -> Selenium-style cookie dict
+        self._form = {}
+        self._elements = []
+        self._quit = False
+
+    # Navigation
+    def get(self, url):
+        if url == 'about:blank':
+            self._load(url, '')
+            return
+        self._request('GET', url)
+
+    def refresh(self):
+        if self.current_url != 'about:blank':
+            self._request('GET', self.current_url)
+
+    def _submit(self):
+        self._request('POST', urljoin(self.current_url, '/login'), dict(self._form))
+
+    def _request(self, method, url, fields=None):
+        self._check_alive()
+        for _ in range(5):
+            headers = {'Cookie': self._cookie_header(url)}
+            body = None
+            if fields is not None:
+                body = urlencode(fields)
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            response = self.http.request(method, url, body=body, headers=headers, redirect=False)
+            self._store_cookies(url, response.headers.getlist('Set-Cookie'))
+            location = response.headers.get('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url, method, fields = urljoin(url, location), 'GET', None
+                continue
+            self._load(url, response.data.decode('utf-8', errors='replace'))
+            return
+        raise RuntimeError(f"Too many redirects loading {url}")
+
+    def _load(self, url, html):
+        self.current_url = url
+        self.page_source = html
+        self._form = {}
+        self._elements = [
+            FakeElement(self, tag.lower(), dict(_ATTR_PATTERN.findall(attrs)), text or '')
+            for tag, attrs, text in _ELEMENT_PATTERN.findall(html)
+        ]
+
+    # Elements
+    def find_elements(self, by=By.ID, value=None):
+        self._check_alive()
+        if by != By.CSS_SELECTOR:
+            return []
+        selectors = [part for part in value.split(',') if part.strip()]
+        return [element for element in self._elements
+                if any(element._matches(selector) for selector in selectors)]
+
+    def find_element(self, by=By.ID, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No element matches {value}")
+        return elements[0]
+
+    # Cookies
+    def get_cookies(self):
+        now = time.time()
+        return [dict(cookie) for cookie in self._cookies.values()
+                if cookie.get('expiry') is None or cookie['expiry'] > now]
+
+    def add_cookie(self, cookie):
+        self._check_alive()
+        if self.current_url == 'about:blank':
+            raise RuntimeError("Cannot set cookies on about:blank")
+        cookie = dict(cookie)
+        cookie.setdefault('domain', urlsplit(self.current_url).hostname)
+        cookie.setdefault('path', '/')
+        self._cookies[cookie['name']] = cookie
+
+    def delete_all_cookies(self):
+        self._cookies.clear()
+
+    def execute_cdp_cmd(self, cmd, args):
+        self._check_alive()
+        if cmd == 'Network.clearBrowserCookies':
+            self._cookies.clear()
+        return {}
+
+    def _cookie_header(self, url):
+        host = urlsplit(url).hostname
+        return '; '.join(f"{cookie['name']}={cookie['value']}" for cookie in self.get_cookies()
+                         if cookie.get('domain', host).lstrip('.') == host)
+
+    def _store_cookies(self, url, headers):
+        host = urlsplit(url).hostname
+        for header in headers:
+            for name, morsel in SimpleCookie(header).items():
+                max_age = morsel['max-age']
+                self._cookies[name] = {
+                    'name': name, 'value': morsel.value, 'domain': host,
+                    'path': morsel['path'] or '/', 'secure': bool(morsel['secure']),
+                    'httpOnly': bool(morsel['httponly']),
+                    'expiry': int(time.time() + int(max_age)) if max_age else None
+                }
+
+    # Lifecycle
+    def execute_script(self, script, *args):
+        self._check_alive()
+        return None
+
+    def quit(self):
+        self._quit = True
+        self.http.clear()
+
+    def _check_alive(self):
+        if self._quit:
+            raise RuntimeError("Driver has been quit")
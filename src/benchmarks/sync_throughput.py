@@ -0,0 +1,350 @@
+"""
+Offline sync throughput benchmark.
+
+Runs the real sync code against a local stub of manus.chat (see stub_site)
+instead of the live site:
+
+    login      ManusService.login for every account
+    verify     ManusService.verify_session for accounts with a stored session
+    scheduler  AccountScheduler.sync_all_accounts over a throwaway database
+
+and reports accounts/minute, p50/p95/max per-account latency and peak RSS of the
+process tree for N accounts at parallelism P. Every run is appended as one
+JSON line to --output and compared with the previous run of the same
+configuration, so regressions show up as a negative delta.
+
+    python -m src.benchmarks.sync_throughput --accounts 200 --parallel 8
+    python -m src.benchmarks.sync_throughput --scenario scheduler --latency-ms 150 --jitter-ms 50
+    python -m src.benchmarks.sync_throughput --driver chrome --accounts 20 --parallel 4
+
+--driver fake (default) uses FakeWebDriver and needs no browser; --driver
+chrome drives headless Chrome against the same stub site, one process per
+parallel account. --driver contexts runs the scheduler scenario in
+SYNC_MODE=contexts (one Chrome, a browser context per account) for a
+memory comparison with --driver chrome.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+SCENARIOS = ('login', 'verify', 'scheduler')
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), 'results', 'sync_throughput.jsonl')
+# Parameters that must match for two runs to be compared
+COMPARE_KEYS = ('scenario', 'driver', 'accounts', 'parallel', 'latency_ms', 'jitter_ms',
+                'error_rate', 'bad_ratio', 'session_ratio')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _process_tree_rss_kb(root_pid):
+    """Resident memory of root_pid and all its descendants (Linux /proc)"""
+    children = {}
+    rss = {}
+    page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+            with open(f'/proc/{entry}/statm') as f:
+                rss[int(entry)] = int(f.read().split()[1]) * page_kb
+        except (OSError, IndexError, ValueError):
+            continue
+        # The command name may contain spaces; ppid follows the closing paren
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class PeakRssSampler:
+    """Samples process-tree RSS in the background (Chrome runs in child processes)"""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._proc = os.path.isdir('/proc')
+
+    def start(self):
+        if self._proc:
+            self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.sample()
+            self._stopped.wait(self.interval)
+
+    def sample(self):
+        if self._proc:
+            self.peak_kb = max(self.peak_kb, _process_tree_rss_kb(os.getpid()))
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        self.sample()
+        # ru_maxrss is in KiB on Linux; covers platforms without /proc
+        self.peak_kb = max(self.peak_kb, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return self.peak_kb
+
+
+def _account_plan(args, site):
+    """(email, password, session_data) for every benchmark account"""
+    rng = random.Random(args.seed)
+    plan = []
+    for i in range(args.accounts):
+        email = f"bench{i}@example.com"
+        password = 'wrong' if rng.random() < args.bad_ratio else site.valid_password
+        session_data = None
+        if rng.random() < args.session_ratio:
+            cookie = site.issue_session(email)
+            if rng.random() < args.revoked_ratio:
+                # Looks fine locally, but the site no longer knows it
+                site.sessions.pop(cookie['value'], None)
+            session_data = {'cookies': [cookie], 'url': site.url + '/app',
+                            'timestamp': datetime.utcnow().isoformat()}
+        plan.append((email, password, session_data))
+    return plan
+
+
+def run_once(args):
+    from src.benchmarks.stub_site import StubManusSite, FakeWebDriver
+
+    site = StubManusSite(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         error_rate=args.error_rate, seed=args.seed).start()
+    # Must be set before ManusService and the scheduler are imported
+    os.environ['MANUS_BASE_URL'] = site.url
+    os.environ['MANUS_HTTP_VERIFY'] = '1' if args.http_verify else '0'
+    # --parallel is the parameter under test; don't let the adaptive limit cap it
+    os.environ['SYNC_CONCURRENCY_MAX'] = str(args.parallel)
+    if args.driver == 'contexts':
+        os.environ['SYNC_MODE'] = 'contexts'
+
+    from src.services.driver_pool import DriverPool
+    from src.services.manus_service import ManusService
+    from src.services.session_verifier import HttpSessionVerifier
+
+    if args.driver == 'contexts':
+        # The scheduler brings its own browser; keep the pool empty
+        pool = DriverPool(max_size=args.parallel, min_size=0)
+    elif args.driver == 'chrome':
+        pool = DriverPool(max_size=args.parallel, min_size=args.parallel)
+    else:
+        pool = DriverPool(max_size=args.parallel, min_size=args.parallel, driver_factory=FakeWebDriver)
+    verifier = HttpSessionVerifier(base_url=site.url) if args.http_verify else None
+
+    def service_factory():
+        return ManusService(pool=pool, http_verifier=verifier)
+
+    plan = _account_plan(args, site)
+    sampler = PeakRssSampler().start()
+    pool.start()
+    try:
+        if args.scenario == 'scheduler':
+            latencies, successes, elapsed = _run_scheduler(args, plan, service_factory)
+        else:
+            latencies, successes, elapsed = _run_calls(args, plan, service_factory)
+    finally:
+        pool.close()
+        peak_kb = sampler.stop()
+        site.stop()
+
+    return {
+        'accounts_synced': len(latencies),
+        'successes': successes,
+        'elapsed_s': round(elapsed, 3),
+        'accounts_per_min': round(len(latencies) / elapsed * 60, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'max_ms': round(max(latencies, default=0) * 1000, 1),
+        'peak_rss_mb': round(peak_kb / 1024, 1),
+        'site_requests': site.requests
+    }
+
+
+def _run_calls(args, plan, service_factory):
+    """Call ManusService directly from P threads"""
+    if args.scenario == 'verify':
+        work = [(email, session_data) for email, _, session_data in plan if session_data]
+    else:
+        work = [(email, password) for email, password, _ in plan]
+
+    def call(item):
+        started = time.perf_counter()
+        service = service_factory()
+        if args.scenario == 'verify':
+            ok = service.verify_session(item[1])[0]
+        else:
+            ok = service.login(*item)[0]
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.parallel) as executor:
+        outcomes = list(executor.map(call, work))
+    elapsed = time.perf_counter() - started
+    return [latency for latency, _ in outcomes], sum(1 for _, ok in outcomes if ok), elapsed
+
+
+def _run_scheduler(args, plan, service_factory):
+    """AccountScheduler.sync_all_accounts over a temporary SQLite database"""
+    from flask import Flask
+    from src.models.user import db
+    from src.models.account import ManusAccount
+    from src.db_config import configure_database
+    from src.services.scheduler import AccountScheduler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        configure_database(app, f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        with app.app_context():
+            db.create_all()
+            for email, password, session_data in plan:
+                account = ManusAccount(email=email)
+                account.set_password(password)
+                if session_data:
+                    account.set_session_data(session_data)
+                db.session.add(account)
+            db.session.commit()
+
+        scheduler = AccountScheduler(app, max_workers=args.parallel)
+        scheduler.engine.service_factory = service_factory
+        started = time.perf_counter()
+        results = scheduler.sync_all_accounts()
+        elapsed = time.perf_counter() - started
+        if hasattr(scheduler.engine, 'close'):
+            scheduler.engine.close()
+
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+    return [result.duration for result in results], sum(1 for result in results if result.success), elapsed
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _previous_run(path, record):
+    """Most recent earlier record with the same configuration"""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            try:
+                candidate = json.loads(line)
+            except ValueError:
+                continue
+            if all(candidate.get(key) == record.get(key) for key in COMPARE_KEYS):
+                previous = candidate
+    return previous
+
+
+def _delta(current, previous, key):
+    if not previous or not previous.get(key):
+        return ''
+    change = (current[key] - previous[key]) / previous[key] * 100
+    return f"{change:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--parallel', type=int, default=4)
+    parser.add_argument('--driver', choices=['fake', 'chrome', 'contexts'], default='fake')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='stub site latency per request')
+    parser.add_argument('--jitter-ms', type=float, default=20.0, help='uniform +/- jitter on top of latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--bad-ratio', type=float, default=0.05, help='fraction of accounts with a wrong password')
+    parser.add_argument('--session-ratio', type=float, default=0.5, help='fraction of accounts with a stored session')
+    parser.add_argument('--revoked-ratio', type=float, default=0.2, help='fraction of stored sessions the site rejects')
+    parser.add_argument('--no-http-verify', dest='http_verify', action='store_false',
+                        help='always verify sessions in the browser')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON lines file results are appended to')
+    parser.add_argument('--no-save', dest='save', action='store_false')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_once(args)
+        print(json.dumps(result))
+        return
+
+    # One process per scenario so peak RSS is not carried over between them
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    if args.driver == 'contexts':
+        # Browser contexts only exist as a scheduler engine
+        scenarios = ('scheduler',)
+    revision = _git_revision()
+    records = []
+    for scenario in scenarios:
+        command = [sys.executable, '-m', 'src.benchmarks.sync_throughput'] + \
+            [arg for arg in sys.argv[1:]] + ['--scenario', scenario, '--child']
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        record = {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'revision': revision,
+            'scenario': scenario,
+            'driver': args.driver,
+            'accounts': args.accounts,
+            'parallel': args.parallel,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'error_rate': args.error_rate,
+            'bad_ratio': args.bad_ratio,
+            'session_ratio': args.session_ratio,
+        }
+        record.update(json.loads(output.strip().splitlines()[-1]))
+        record['previous'] = _previous_run(args.output, record) if args.save else None
+        records.append(record)
+
+    columns = ['scenario', 'accounts_synced', 'successes', 'accounts_per_min', 'p50_ms', 'p95_ms', 'max_ms',
+               'peak_rss_mb']
+    print('  '.join(f"{column:>16}" for column in columns) + '  ' + f"{'vs previous':>16}")
+    for record in records:
+        previous = record.pop('previous')
+        row = '  '.join(f"{str(record[column]):>16}" for column in columns)
+        print(row + '  ' + f"{_delta(record, previous, 'accounts_per_min'):>16}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+        print(f"Results appended to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Write-contention benchmark for the database layer.
+
+Runs the real sync code paths against a throwaway database at the same time:
+the SyncQueue workers (per-account commits), AccountScheduler.sync_accounts
+(batched commit) and request-style readers. ManusService is replaced by an
+instant fake so only database behaviour is measured.
+
+    python -m src.benchmarks.write_contention --accounts 300
+    python -m src.benchmarks.write_contention --mode tuned --database-url postgresql://...
+
+By default both the tuned configuration (WAL, busy_timeout, synchronous=NORMAL,
+sized pool) and the previous defaults are run, each in its own process.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BASELINE_ENV = {
+    # What the app ran with before db_config existed
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    'DB_POOL_SIZE': '5',
+    'DB_MAX_OVERFLOW': '10'
+}
+
+
+class FakeManusService:
+    latency = 0.0
+
+    def refresh_session(self, email, password, old_session_data=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return True, {'cookies': [{'name': 'sid', 'value': email}]}, "Login successful"
+
+
+def run_once(args):
+    from flask import Flask
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from src.models.user import db
+    from src.models.account import ManusAccount
+    from src.db_config import configure_database
+    from src.services.sync_queue import SyncQueue, PRIORITY_MANUAL
+    from src.services.scheduler import AccountScheduler
+
+    lock_errors = []
+
+    @event.listens_for(Engine, 'handle_error')
+    def count_lock_errors(context):
+        if 'locked' in str(context.original_exception).lower():
+            lock_errors.append(time.monotonic())
+
+    FakeManusService.latency = args.latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app = Flask(__name__)
+        configure_database(app, url)
+
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for i in range(args.accounts):
+                account = ManusAccount(email=f"bench{i}@example.com")
+                account.set_password('secret')
+                db.session.add(account)
+            db.session.commit()
+            account_ids = [account_id for (account_id,) in db.session.query(ManusAccount.id)]
+
+        queue = SyncQueue(app, workers=args.queue_workers, history_size=args.accounts * 2,
+                          service_factory=FakeManusService)
+        scheduler = AccountScheduler(app, max_workers=args.scheduler_workers)
+        scheduler.engine.service_factory = FakeManusService
+
+        stop_readers = threading.Event()
+        reads = []
+
+        def reader():
+            with app.app_context():
+                while not stop_readers.is_set():
+                    try:
+                        ManusAccount.query.filter_by(status='active').count()
+                        reads.append(1)
+                    except Exception:
+                        pass
+                    finally:
+                        db.session.rollback()
+
+        readers = [threading.Thread(target=reader, daemon=True) for _ in range(args.readers)]
+        started = time.monotonic()
+        for thread in readers:
+            thread.start()
+
+        queue.start()
+        jobs = queue.submit_many(account_ids, PRIORITY_MANUAL, source='benchmark')
+        scheduler_thread = threading.Thread(target=scheduler.sync_accounts, daemon=True)
+        scheduler_thread.start()
+
+        while any(job.status in ('queued', 'running') for job in jobs):
+            time.sleep(0.05)
+        scheduler_thread.join()
+        elapsed = time.monotonic() - started
+        stop_readers.set()
+        for thread in readers:
+            thread.join(timeout=5)
+        queue.stop()
+
+        failed = [job for job in jobs if job.status == 'failed']
+        skipped = [job for job in jobs if job.status == 'skipped']
+        with app.app_context():
+            active = ManusAccount.query.filter_by(status='active').count()
+            db.session.remove()
+            db.engine.dispose()
+
+    return {
+        'url': url.split('://')[0],
+        'accounts': args.accounts,
+        'elapsed_s': round(elapsed, 3),
+        'queue_commits_per_s': round((len(jobs) - len(failed) - len(skipped)) / elapsed, 1),
+        'failed_queue_jobs': len(failed),
+        'skipped_queue_jobs': len(skipped),
+        'lock_errors': len(lock_errors),
+        'reads': len(reads),
+        'active_accounts': active
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--accounts', type=int, default=200)
+    parser.add_argument('--queue-workers', type=int, default=8)
+    parser.add_argument('--scheduler-workers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='fake login latency per account')
+    parser.add_argument('--database-url', help='benchmark another engine instead of a temp SQLite file')
+    parser.add_argument('--mode', choices=['both', 'tuned', 'baseline'], default='both')
+    parser.add_argument('--json', action='store_true', help='print one JSON object per mode')
+    args = parser.parse_args()
+
+    if args.mode != 'both':
+        result = run_once(args)
+        result['mode'] = args.mode
+        print(json.dumps(result))
+        return
+
+    # Each mode runs in a fresh process so its environment applies at import time
+    results = []
+    for mode in ('baseline', 'tuned'):
+        env = dict(os.environ)
+        if mode == 'baseline':
+            env.update(BASELINE_ENV)
+        command = [sys.executable, '-m', 'src.benchmarks.write_contention'] + \
+            [arg for arg in sys.argv[1:] if arg != '--json'] + ['--mode', mode]
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    columns = ['mode', 'elapsed_s', 'queue_commits_per_s', 'failed_queue_jobs', 'skipped_queue_jobs',
+               'lock_errors', 'reads', 'active_accounts']
+    print('  '.join(f"{column:>19}" for column in columns))
+    for result in results:
+        print('  '.join(f"{str(result[column]):>19}" for column in columns))
+
+
+if __name__ == '__main__':
+    main()
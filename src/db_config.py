@@ -0,0 +1,80 @@
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.models.user import db
+
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
+
+# How long a SQLite writer waits for the lock before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# Connection pool sizing; request threads, queue workers and the scheduler share it
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+
+
+def database_url():
+    """DATABASE_URL from the environment, else the bundled SQLite file"""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+        if url.startswith('postgres://'):
+            url = 'postgresql://' + url[len('postgres://'):]
+        return url
+    return f"sqlite:///{DEFAULT_SQLITE_PATH}"
+
+
+def engine_options(url):
+    """SQLAlchemy create_engine options suited to several threads writing at once"""
+    if url.startswith('sqlite'):
+        options = {
+            'connect_args': {
+                # Python-level wait on top of PRAGMA busy_timeout
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+                # Connections move between pool threads, never used concurrently
+                'check_same_thread': False
+            }
+        }
+        if ':memory:' not in url and url not in ('sqlite://', 'sqlite:///'):
+            options.update({
+                'pool_size': DB_POOL_SIZE,
+                'max_overflow': DB_MAX_OVERFLOW,
+                'pool_timeout': DB_POOL_TIMEOUT
+            })
+        return options
+
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply WAL, busy_timeout and synchronous to every new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    finally:
+        cursor.close()
+
+
+def configure_database(app, url=None):
+    """Point the app at its database and initialise Flask-SQLAlchemy"""
+    url = url or database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
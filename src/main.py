@@ -1,57 +1,91 @@
 import os
 import sys
+import time
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, request
 from flask_cors import CORS
 from src.models.user import db
+from src.db_config import configure_database
+from src.migrations import run_migrations
 from src.models.account import ManusAccount
 from src.routes.user import user_bp
 from src.routes.account import account_bp
 from src.routes.auth import auth_bp
-from src.services.scheduler import AccountScheduler
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Enable CORS for all routes
-CORS(app, origins="*", supports_credentials=True)
-
-# Register blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(account_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Initialize database and scheduler
-with app.app_context():
-    db.create_all()
-
-# Initialize and start scheduler
-scheduler = AccountScheduler(app)
-scheduler.start()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
+from src.routes.metrics import metrics_bp
+from src.services.events import install_status_events
+from src.services.static_assets import AssetManifest
+from src.services.metrics import app_startup_seconds
+
+# 'on': run the account scheduler in this process,
+# 'off': serve HTTP only, e.g. when src/scheduler_main.py runs it instead
+SCHEDULER_ROLE = os.environ.get('SCHEDULER_ROLE', 'on')
+
+
+def create_app(scheduler_role=None):
+    """Build the Flask app and, unless scheduler_role is 'off', start the scheduler"""
+    started = time.perf_counter()
+    scheduler_role = scheduler_role or SCHEDULER_ROLE
+
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+
+    # Enable CORS for all routes
+    CORS(app, origins="*", supports_credentials=True)
+
+    # Register blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(account_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    # Database configuration (DATABASE_URL, SQLite WAL/busy_timeout, pool sizing)
+    configure_database(app)
+
+    # Publish committed account status changes to /api/accounts/events
+    install_status_events()
+
+    # Initialize database
+    with app.app_context():
+        run_migrations()
+
+    # Static files are indexed and compressed once; requests never touch the disk
+    asset_manifest = AssetManifest(app.static_folder)
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if app.static_folder is None:
+                return "Static folder not configured", 404
+
+        response = asset_manifest.respond(path, request)
+        if response is None:
             return "index.html not found", 404
+        return response
+
+    if scheduler_role != 'off':
+        start_scheduler(app)
+
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+    app_startup_seconds.set(round(app.config['STARTUP_SECONDS'], 4))
+    print(f"[{os.getpid()}] App created in {app.config['STARTUP_SECONDS'] * 1000:.0f} ms "
+          f"(scheduler role: {scheduler_role})")
+    return app
+
+
+def start_scheduler(app):
+    """Start the account scheduler in this process"""
+    # Imported here so an HTTP-only process never loads the sync stack
+    from src.services.scheduler import AccountScheduler
+
+    scheduler = AccountScheduler(app)
+    app.extensions['account_scheduler'] = scheduler
+    scheduler.start()
+    return scheduler
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app = create_app()
+    # The reloader would fork a second process with a scheduler of its own
+    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
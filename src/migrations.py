@@ -0,0 +1,71 @@
+from src.models.user import db
+from src.models.account import ManusAccount, decode_data
+from src.models.session import ManusSession
+from src.models.sync_run import SyncRun, SyncRunItem
+from src.models.sync_event import SyncEvent, SyncRollup, SyncAccountDaily
+from sqlalchemy import inspect, text
+import json
+
+# Accounts migrated per commit
+MIGRATION_BATCH_SIZE = 200
+
+
+def migrate_legacy_sessions():
+    """Move base64 session blobs from manus_accounts.session_data into manus_sessions"""
+    migrated = 0
+    while True:
+        accounts = ManusAccount.query.filter(ManusAccount.session_data.isnot(None)) \
+            .order_by(ManusAccount.id).limit(MIGRATION_BATCH_SIZE).all()
+        if not accounts:
+            break
+        for account in accounts:
+            try:
+                decoded_data = decode_data(account.session_data)
+                session_dict = json.loads(decoded_data) if decoded_data else {}
+            except Exception:
+                session_dict = {}
+            # Clears the legacy column too, so the loop always makes progress
+            account.set_session_data(session_dict)
+            migrated += 1
+        db.session.commit()
+        db.session.expunge_all()
+
+    if migrated:
+        print(f"Migrated {migrated} legacy sessions to manus_sessions")
+    return migrated
+
+
+def add_missing_columns(model):
+    """ALTER TABLE ADD COLUMN for columns of model an older database lacks, plus their indexes"""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if not missing:
+        return []
+
+    preparer = db.engine.dialect.identifier_preparer
+    for column in missing:
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {preparer.quote(table.name)} "
+                                  f"ADD COLUMN {preparer.quote(column.name)} {column_type}"))
+        except Exception:
+            # Another process starting at the same time may have added it first
+            columns = {c['name'] for c in inspect(db.engine).get_columns(table.name)}
+            if column.name not in columns:
+                raise
+    for index in table.indexes:
+        if any(column in missing for column in index.columns):
+            index.create(db.engine, checkfirst=True)
+
+    print(f"Added columns to {table.name}: {', '.join(column.name for column in missing)}")
+    return missing
+
+
+def run_migrations():
+    """Bring an existing database up to the current schema (call inside an app context)"""
+    db.create_all()
+    # Lease columns (account_leases) were added after the table first shipped
+    add_missing_columns(ManusAccount)
+    migrate_legacy_sessions()
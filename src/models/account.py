@@ -1,4 +1,7 @@
 from src.models.user import db
+from src.models.session import ManusSession
+from src.models.retry import SyncRetry
+from sqlalchemy.orm import deferred
 from datetime import datetime
 import base64
 import os
@@ -24,9 +27,18 @@ class ManusAccount(db.Model):
     encrypted_password = db.Column(db.Text, nullable=False)
     last_login = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='inactive')  # 'active', 'error', 'inactive'
-    session_data = db.Column(db.Text)  # JSON string for cookies/tokens
+    session_data = deferred(db.Column(db.Text))  # Legacy encoded JSON; migrated to manus_sessions
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Sync lease: which instance is syncing the account and until when (see account_leases)
+    lease_owner = db.Column(db.String(120), index=True)
+    lease_expires_at = db.Column(db.DateTime, index=True)
+    lease_heartbeat_at = db.Column(db.DateTime)
+    
+    session_record = db.relationship(ManusSession, uselist=False, backref='account',
+                                     cascade='all, delete-orphan')
+    retry_record = db.relationship(SyncRetry, uselist=False, backref='account',
+                                   cascade='all, delete-orphan')
     
     def set_password(self, password):
         """Encode and store password"""
@@ -37,15 +49,19 @@ class ManusAccount(db.Model):
         return decode_data(self.encrypted_password)
     
     def set_session_data(self, session_dict):
-        """Store session data as encoded JSON"""
+        """Store session data in the account's manus_sessions row"""
         if session_dict:
-            json_data = json.dumps(session_dict)
-            self.session_data = encode_data(json_data)
+            if self.session_record is None:
+                self.session_record = ManusSession()
+            self.session_record.set_data(session_dict)
         else:
-            self.session_data = None
+            self.session_record = None
+        self.session_data = None
     
     def get_session_data(self):
-        """Retrieve and decode session data"""
+        """Retrieve session data, falling back to the legacy column"""
+        if self.session_record is not None:
+            return self.session_record.get_data()
         if not self.session_data:
             return {}
         try:
@@ -54,8 +70,11 @@ class ManusAccount(db.Model):
         except:
             return {}
     
-    def to_dict(self):
-        return {
+    # Columns exposed by to_dict(); list views only need to load these
+    DICT_FIELDS = ('id', 'email', 'last_login', 'status', 'created_at', 'updated_at')
+    
+    def to_dict(self, fields=None):
+        data = {
             'id': self.id,
             'email': self.email,
             'last_login': self.last_login.isoformat() if self.last_login else None,
@@ -63,6 +82,9 @@ class ManusAccount(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if fields:
+            data = {key: value for key, value in data.items() if key in fields}
+        return data
     
     def __repr__(self):
         return f'<ManusAccount {self.email}>'
@@ -0,0 +1,39 @@
+from src.models.user import db
+from datetime import datetime
+
+
+class SyncRetry(db.Model):
+    """Failure state of one ManusAccount; the row exists only while its last sync failed"""
+    __tablename__ = 'manus_sync_retries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('manus_accounts.id', ondelete='CASCADE'),
+                           unique=True, nullable=False)
+    # Consecutive failed syncs
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    # 'upstream' or 'local' (transient, retried) or 'rejected' (permanent)
+    error_kind = db.Column(db.String(20))
+    last_error = db.Column(db.Text)
+    # NULL once the account is no longer retried (permanent error or attempts exhausted)
+    next_attempt_at = db.Column(db.DateTime, index=True)
+    first_failed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def parked(self):
+        return self.next_attempt_at is None
+
+    def to_dict(self):
+        return {
+            'account_id': self.account_id,
+            'attempts': self.attempts,
+            'error_kind': self.error_kind,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'parked': self.parked,
+            'first_failed_at': self.first_failed_at.isoformat() if self.first_failed_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<SyncRetry account={self.account_id} attempts={self.attempts}>'
@@ -0,0 +1,59 @@
+from src.models.user import db
+from sqlalchemy.orm import deferred
+from datetime import datetime
+import json
+import zlib
+
+# Payloads larger than this (bytes of JSON) are stored zlib-compressed
+COMPRESS_THRESHOLD = 1024
+
+
+class ManusSession(db.Model):
+    """Stored browser session (cookies) for one ManusAccount"""
+    __tablename__ = 'manus_sessions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('manus_accounts.id', ondelete='CASCADE'),
+                           unique=True, nullable=False)
+    # Earliest expiry among persistent cookies; NULL when there are only session cookies
+    earliest_expiry = db.Column(db.DateTime, index=True)
+    cookie_count = db.Column(db.Integer, default=0)
+    # The cookie payload is only loaded when actually needed
+    payload = deferred(db.Column(db.LargeBinary))
+    compressed = db.Column(db.Boolean, default=False)
+    captured_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def set_data(self, session_dict):
+        """Serialize session data and refresh the indexed summary columns"""
+        raw = json.dumps(session_dict).encode()
+        if len(raw) > COMPRESS_THRESHOLD:
+            self.payload = zlib.compress(raw)
+            self.compressed = True
+        else:
+            self.payload = raw
+            self.compressed = False
+
+        cookies = session_dict.get('cookies') or []
+        expiries = [cookie['expiry'] for cookie in cookies if cookie.get('expiry') is not None]
+        self.earliest_expiry = datetime.utcfromtimestamp(min(expiries)) if expiries else None
+        self.cookie_count = len(cookies)
+        self.captured_at = datetime.utcnow()
+
+    def get_data(self):
+        """Deserialize session data"""
+        if not self.payload:
+            return {}
+        try:
+            raw = zlib.decompress(self.payload) if self.compressed else self.payload
+            return json.loads(raw)
+        except Exception:
+            return {}
+
+    @classmethod
+    def expiring_before(cls, moment):
+        """Query for sessions whose earliest cookie expires before moment"""
+        return cls.query.filter(cls.earliest_expiry.isnot(None), cls.earliest_expiry < moment)
+
+    def __repr__(self):
+        return f'<ManusSession account={self.account_id}>'
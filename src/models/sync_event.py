@@ -0,0 +1,74 @@
+from src.models.user import db
+from datetime import datetime
+
+
+class SyncEvent(db.Model):
+    """One finished sync attempt; rows are only ever appended (and pruned by age)"""
+    __tablename__ = 'sync_events'
+    __table_args__ = (
+        db.Index('ix_sync_events_account_time', 'account_id', 'occurred_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, nullable=False)
+    occurred_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    outcome = db.Column(db.String(20), nullable=False)  # 'success', 'failure', 'timeout', 'skipped'
+    duration = db.Column(db.Float, default=0.0)  # seconds
+    error_class = db.Column(db.String(20))  # sync_control kind of a failure: 'rejected', 'upstream', 'local'
+    path = db.Column(db.String(20))  # 'verified' or 'relogin'
+    message = db.Column(db.String(255))
+
+    def to_dict(self):
+        return {
+            'account_id': self.account_id,
+            'occurred_at': self.occurred_at.isoformat() if self.occurred_at else None,
+            'outcome': self.outcome,
+            'duration': self.duration,
+            'error_class': self.error_class,
+            'path': self.path,
+            'message': self.message
+        }
+
+    def __repr__(self):
+        return f'<SyncEvent account={self.account_id} {self.outcome}>'
+
+
+class SyncRollup(db.Model):
+    """Sync events aggregated per hour or day; dimensions use '' rather than NULL"""
+    __tablename__ = 'sync_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'bucket_start', 'outcome', 'path', 'error_class'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, nullable=False, index=True)
+    outcome = db.Column(db.String(20), nullable=False)
+    path = db.Column(db.String(20), nullable=False, default='')
+    error_class = db.Column(db.String(20), nullable=False, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Float, nullable=False, default=0.0)
+    max_duration = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<SyncRollup {self.period} {self.bucket_start} {self.outcome} x{self.count}>'
+
+
+class SyncAccountDaily(db.Model):
+    """Per-account daily tallies, enough to spot flapping accounts without raw events"""
+    __tablename__ = 'sync_account_daily'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'account_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.DateTime, nullable=False, index=True)
+    account_id = db.Column(db.Integer, nullable=False, index=True)
+    successes = db.Column(db.Integer, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    # Success <-> failure changes in the day, counted in event order
+    flips = db.Column(db.Integer, nullable=False, default=0)
+    total_duration = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<SyncAccountDaily {self.day:%Y-%m-%d} account={self.account_id}>'
@@ -0,0 +1,78 @@
+from src.models.user import db
+from datetime import datetime
+
+# SyncRunItem states; everything but 'pending' is final
+ITEM_PENDING = 'pending'
+ITEM_SUCCEEDED = 'succeeded'
+ITEM_FAILED = 'failed'
+ITEM_SKIPPED = 'skipped'
+ITEM_STATES = (ITEM_PENDING, ITEM_SUCCEEDED, ITEM_FAILED, ITEM_SKIPPED)
+
+
+class SyncRun(db.Model):
+    """One sync over a set of accounts; survives restarts so it can be resumed"""
+    __tablename__ = 'sync_runs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    source = db.Column(db.String(30))  # 'scheduled', 'sync_all', ...
+    status = db.Column(db.String(20), default='running', index=True)  # 'running', 'completed'
+    # Process currently driving the run (host:pid:token) and its last checkpoint
+    owner = db.Column(db.String(120))
+    heartbeat_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resumed = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer, default=0)
+    # Final tallies, filled in when the run completes
+    succeeded = db.Column(db.Integer)
+    failed = db.Column(db.Integer)
+    skipped = db.Column(db.Integer)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self, progress=None):
+        data = {
+            'id': self.id,
+            'source': self.source,
+            'status': self.status,
+            'owner': self.owner,
+            'resumed': self.resumed,
+            'total': self.total,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
+        if progress is None:
+            progress = {ITEM_SUCCEEDED: self.succeeded or 0, ITEM_FAILED: self.failed or 0,
+                        ITEM_SKIPPED: self.skipped or 0}
+            progress[ITEM_PENDING] = max(0, (self.total or 0) - sum(progress.values()))
+        data['progress'] = {state: progress.get(state, 0) for state in ITEM_STATES}
+        return data
+
+    def __repr__(self):
+        return f'<SyncRun {self.id} {self.status}>'
+
+
+class SyncRunItem(db.Model):
+    """Checkpoint of one account within a SyncRun"""
+    __tablename__ = 'sync_run_items'
+    __table_args__ = (
+        db.UniqueConstraint('run_id', 'account_id'),
+        db.Index('ix_sync_run_items_run_state', 'run_id', 'state', 'account_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.String(32), db.ForeignKey('sync_runs.id', ondelete='CASCADE'), nullable=False)
+    account_id = db.Column(db.Integer, nullable=False)
+    state = db.Column(db.String(20), default=ITEM_PENDING, nullable=False)
+    message = db.Column(db.Text)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'account_id': self.account_id,
+            'state': self.state,
+            'message': self.message,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<SyncRunItem run={self.run_id} account={self.account_id} {self.state}>'
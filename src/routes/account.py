@@ -1,21 +1,146 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy.orm import load_only
 from src.models.account import ManusAccount, db
-from src.services.manus_service import ManusService
+from src.models.retry import SyncRetry
+from src.models.sync_run import SyncRun, SyncRunItem, ITEM_STATES
+from src.services.sync_queue import get_sync_queue, PRIORITY_MANUAL, PRIORITY_SCHEDULED
+from src.services import account_io
+from src.services import sync_runs
+from src.services import sync_history
+from src.services import sync_trace
+from src.services.events import account_events
 from src.routes.auth import require_auth
-from datetime import datetime
-import threading
+from datetime import datetime, timezone
+import hashlib
 
 account_bp = Blueprint('account', __name__)
 
+MAX_PAGE_SIZE = 500
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 3000
+
 @account_bp.route('/accounts', methods=['GET'])
 @require_auth
 def get_accounts():
-    """Get all accounts with their status"""
+    """
+    Get accounts with their status.
+    Optional query parameters: status (comma separated), email_prefix,
+    fields (comma separated), limit and after (id cursor from next_cursor).
+    Answers 304 when nothing changed since the ETag the client sent.
+    """
     try:
-        accounts = ManusAccount.query.all()
+        query = ManusAccount.query
+        
+        statuses = [value for value in request.args.get('status', '').split(',') if value]
+        if statuses:
+            query = query.filter(ManusAccount.status.in_(statuses))
+        
+        email_prefix = request.args.get('email_prefix')
+        if email_prefix:
+            query = query.filter(ManusAccount.email.startswith(email_prefix, autoescape=True))
+        
+        fields = [value for value in request.args.get('fields', '').split(',') if value]
+        unknown = [value for value in fields if value not in ManusAccount.DICT_FIELDS]
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown fields: {', '.join(unknown)}"
+            }), 400
+        
+        limit = request.args.get('limit', type=int)
+        after = request.args.get('after', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if after is not None:
+            query = query.filter(ManusAccount.id > after)
+        
+        # Cheap fingerprint of the filtered set; count and max id catch inserts and deletes
+        max_updated, total, max_id = query.with_entities(
+            db.func.max(ManusAccount.updated_at), db.func.count(ManusAccount.id), db.func.max(ManusAccount.id)
+        ).one()
+        etag = hashlib.sha1(
+            f"{max_updated}|{total}|{max_id}|{request.query_string.decode()}".encode()
+        ).hexdigest()
+        
+        if request.if_none_match:
+            if request.if_none_match.contains(etag):
+                return _not_modified(etag, max_updated)
+        elif request.if_modified_since and max_updated and \
+                max_updated.replace(microsecond=0, tzinfo=timezone.utc) <= request.if_modified_since:
+            return _not_modified(etag, max_updated)
+        
+        # Only load the columns that are serialized, never the session blob
+        columns = [getattr(ManusAccount, name) for name in (fields or ManusAccount.DICT_FIELDS)]
+        query = query.options(load_only(*columns)).order_by(ManusAccount.id)
+        if limit is not None:
+            query = query.limit(limit + 1)
+        accounts = query.all()
+        
+        next_cursor = None
+        if limit is not None and len(accounts) > limit:
+            accounts = accounts[:limit]
+            next_cursor = accounts[-1].id
+        
+        response = jsonify({
+            'success': True,
+            'accounts': [account.to_dict(fields) for account in accounts],
+            'next_cursor': next_cursor
+        })
+        response.set_etag(etag)
+        if max_updated:
+            response.last_modified = max_updated.replace(tzinfo=timezone.utc)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _not_modified(etag, last_modified):
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _parse_utc(value):
+    """Naive UTC datetime from an ISO 8601 string (None stays None)"""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@account_bp.route('/accounts/stats', methods=['GET'])
+@require_auth
+def get_account_stats():
+    """
+    Sync success rate, latency, error classes and flapping accounts, from the rollups.
+    Optional query parameters: period (hour or day), since and until (ISO UTC), flapping (limit).
+    """
+    try:
+        period = request.args.get('period', 'hour')
+        if period not in sync_history.PERIODS:
+            return jsonify({
+                'success': False,
+                'error': 'period must be hour or day'
+            }), 400
+        
+        try:
+            since, until = (_parse_utc(request.args.get(name)) for name in ('since', 'until'))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'since and until must be ISO 8601 timestamps'
+            }), 400
+        
+        flapping = max(0, min(request.args.get('flapping', 10, type=int), MAX_PAGE_SIZE))
         return jsonify({
             'success': True,
-            'accounts': [account.to_dict() for account in accounts]
+            **sync_history.stats(period, since, until, flapping)
         })
     except Exception as e:
         return jsonify({
@@ -23,6 +148,43 @@ def get_accounts():
             'error': str(e)
         }), 500
 
+@account_bp.route('/accounts/events', methods=['GET'])
+@require_auth
+def account_events_stream():
+    """Server-sent events for account status changes"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscription, replay = account_events.subscribe(last_event_id)
+    
+    def stream():
+        try:
+            # Tell the client how long to wait before reconnecting
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if replay is None:
+                # Missed events fell out of the buffer; the client must refetch
+                yield f"id: {account_events.last_id}\nevent: reset\ndata: {{}}\n\n"
+            else:
+                for evt in replay:
+                    yield evt.to_sse()
+            
+            while not subscription.overflowed:
+                evt = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if evt is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield evt.to_sse()
+        finally:
+            subscription.close()
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @account_bp.route('/accounts', methods=['POST'])
 @require_auth
 def add_account():
@@ -55,30 +217,13 @@ def add_account():
         db.session.add(account)
         db.session.commit()
         
-        # Try to login immediately to verify credentials
-        def verify_login():
-            from src.main import app
-            with app.app_context():
-                manus_service = ManusService()
-                success, session_data, error_msg = manus_service.login(email, password)
-                
-                if success:
-                    account.status = 'active'
-                    account.last_login = datetime.utcnow()
-                    account.set_session_data(session_data)
-                else:
-                    account.status = 'error'
-                
-                db.session.commit()
-        
-        # Run login verification in background
-        thread = threading.Thread(target=verify_login)
-        thread.daemon = True
-        thread.start()
+        # Queue a login right away to verify credentials
+        job = get_sync_queue().submit(account.id, PRIORITY_MANUAL, source='add_account')
         
         return jsonify({
             'success': True,
             'account': account.to_dict(),
+            'job': job.to_dict(),
             'message': 'Account added successfully. Login verification in progress.'
         })
         
@@ -116,51 +261,77 @@ def delete_account(account_id):
             'error': str(e)
         }), 500
 
+@account_bp.route('/accounts/import', methods=['POST'])
+@require_auth
+def import_accounts():
+    """Bulk add accounts from a CSV (email,password) or JSON Lines upload"""
+    try:
+        fmt = account_io.detect_format(request.args.get('format'), request.content_type)
+        if not fmt:
+            return jsonify({
+                'success': False,
+                'error': 'Upload must be CSV or JSON Lines (set format=csv or format=jsonl)'
+            }), 400
+        
+        verify = request.args.get('verify', '1') != '0'
+        queue = get_sync_queue() if verify else None
+        
+        def queue_verification(account_ids):
+            # Workers drain these at their own pace; nothing starts a browser here
+            queue.submit_many(account_ids, PRIORITY_SCHEDULED, source='import')
+        
+        report = account_io.import_accounts(request.stream, fmt,
+                                            on_batch=queue_verification if verify else None)
+        
+        return jsonify({
+            'success': True,
+            **report.to_dict(),
+            'message': f'{report.created} accounts imported'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/export', methods=['GET'])
+@require_auth
+def export_accounts():
+    """Stream account metadata as CSV or JSON Lines"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in account_io.FORMATS:
+        return jsonify({
+            'success': False,
+            'error': 'format must be csv or jsonl'
+        }), 400
+    
+    return Response(stream_with_context(account_io.iter_export(fmt)),
+                    mimetype=account_io.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=accounts.{fmt}'})
+
 @account_bp.route('/accounts/sync', methods=['POST'])
 @require_auth
 def sync_accounts():
     """Manually sync all accounts"""
     try:
-        accounts = ManusAccount.query.all()
-        
-        def sync_account(account):
-            from src.main import app
-            with app.app_context():
-                manus_service = ManusService()
-                password = account.get_password()
-                
-                if not password:
-                    account.status = 'error'
-                    db.session.commit()
-                    return
-                
-                success, session_data, error_msg = manus_service.refresh_session(
-                    account.email, 
-                    password, 
-                    account.get_session_data()
-                )
-                
-                if success:
-                    account.status = 'active'
-                    account.last_login = datetime.utcnow()
-                    account.set_session_data(session_data)
-                else:
-                    account.status = 'error'
-                
-                account.updated_at = datetime.utcnow()
-                db.session.commit()
+        account_ids = [account_id for (account_id,) in db.session.query(ManusAccount.id).all()]
         
-        # Sync all accounts in background threads
-        threads = []
-        for account in accounts:
-            thread = threading.Thread(target=sync_account, args=(account,))
-            thread.daemon = True
-            thread.start()
-            threads.append(thread)
+        # Recorded as a run so it is resumed if this process goes away mid-way
+        run = sync_runs.start_run('sync_all', account_ids)
+        if not account_ids:
+            # No queue job will ever checkpoint (and so complete) an empty run
+            sync_runs.finish_run(run.id)
+        
+        # Queue every account; ones already queued or running are not added twice
+        jobs = get_sync_queue().submit_many(account_ids, PRIORITY_MANUAL, source='sync_all', run_id=run.id)
         
         return jsonify({
             'success': True,
-            'message': f'Synchronization started for {len(accounts)} accounts'
+            'run': run.to_dict(sync_runs.progress([run.id])[run.id]),
+            'jobs': [job.to_dict() for job in jobs],
+            'message': f'Synchronization queued for {len(jobs)} accounts'
         })
         
     except Exception as e:
@@ -181,40 +352,11 @@ def sync_single_account(account_id):
                 'error': 'Account not found'
             }), 404
         
-        def sync_account():
-            from src.main import app
-            with app.app_context():
-                manus_service = ManusService()
-                password = account.get_password()
-                
-                if not password:
-                    account.status = 'error'
-                    db.session.commit()
-                    return
-                
-                success, session_data, error_msg = manus_service.refresh_session(
-                    account.email, 
-                    password, 
-                    account.get_session_data()
-                )
-                
-                if success:
-                    account.status = 'active'
-                    account.last_login = datetime.utcnow()
-                    account.set_session_data(session_data)
-                else:
-                    account.status = 'error'
-                
-                account.updated_at = datetime.utcnow()
-                db.session.commit()
-        
-        # Run sync in background
-        thread = threading.Thread(target=sync_account)
-        thread.daemon = True
-        thread.start()
+        job = get_sync_queue().submit(account.id, PRIORITY_MANUAL, source='sync_single')
         
         return jsonify({
             'success': True,
+            'job': job.to_dict(),
             'message': 'Account synchronization started'
         })
         
@@ -224,3 +366,198 @@ def sync_single_account(account_id):
             'error': str(e)
         }), 500
 
+@account_bp.route('/accounts/sync/jobs', methods=['GET'])
+@require_auth
+def list_sync_jobs():
+    """List queued, running and recently finished sync jobs"""
+    try:
+        queue = get_sync_queue()
+        jobs = queue.jobs(status=request.args.get('status'))
+        return jsonify({
+            'success': True,
+            'stats': queue.stats(),
+            'jobs': [job.to_dict() for job in jobs]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/sync/runs', methods=['GET'])
+@require_auth
+def list_sync_runs():
+    """
+    List sync runs, newest first, with their progress.
+    Optional query parameters: status (running or completed), limit.
+    """
+    try:
+        query = SyncRun.query
+        status = request.args.get('status')
+        if status:
+            query = query.filter(SyncRun.status == status)
+        limit = max(1, min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE))
+        runs = query.order_by(SyncRun.started_at.desc()).limit(limit).all()
+        
+        # Live counts for running runs; completed ones carry their tallies
+        live = sync_runs.progress([run.id for run in runs if run.status == 'running'])
+        return jsonify({
+            'success': True,
+            'runs': [run.to_dict(live.get(run.id)) for run in runs]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/sync/runs/<run_id>', methods=['GET'])
+@require_auth
+def get_sync_run(run_id):
+    """
+    Get one sync run with its progress.
+    Optional query parameters: state (list that run's items in this state), limit, after.
+    """
+    try:
+        run = SyncRun.query.get(run_id)
+        if not run:
+            return jsonify({
+                'success': False,
+                'error': 'Run not found'
+            }), 404
+        
+        data = {
+            'success': True,
+            'run': run.to_dict(sync_runs.progress([run.id])[run.id])
+        }
+        
+        state = request.args.get('state')
+        if state:
+            if state not in ITEM_STATES:
+                return jsonify({
+                    'success': False,
+                    'error': f"state must be one of {', '.join(ITEM_STATES)}"
+                }), 400
+            limit = max(1, min(request.args.get('limit', MAX_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+            query = SyncRunItem.query.filter_by(run_id=run.id, state=state)
+            after = request.args.get('after', type=int)
+            if after is not None:
+                query = query.filter(SyncRunItem.account_id > after)
+            items = query.order_by(SyncRunItem.account_id).limit(limit + 1).all()
+            data['next_cursor'] = items[limit - 1].account_id if len(items) > limit else None
+            data['items'] = [item.to_dict() for item in items[:limit]]
+        
+        return jsonify(data)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/sync/retries', methods=['GET'])
+@require_auth
+def list_sync_retries():
+    """
+    List accounts whose last sync failed, with their retry schedule.
+    Optional query parameter: parked=1 (not retried) or parked=0 (retry pending).
+    """
+    try:
+        query = db.session.query(SyncRetry, ManusAccount.email) \
+            .join(ManusAccount, ManusAccount.id == SyncRetry.account_id)
+        
+        parked = request.args.get('parked')
+        if parked == '1':
+            query = query.filter(SyncRetry.next_attempt_at.is_(None))
+        elif parked == '0':
+            query = query.filter(SyncRetry.next_attempt_at.isnot(None))
+        
+        rows = query.order_by(SyncRetry.next_attempt_at, SyncRetry.account_id).all()
+        return jsonify({
+            'success': True,
+            'retries': [dict(retry.to_dict(), email=email) for retry, email in rows]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/sync/traces', methods=['GET'])
+@require_auth
+def list_sync_traces():
+    """List saved trace bundles of slow or failed syncs, newest first"""
+    try:
+        return jsonify({
+            'success': True,
+            'enabled': sync_trace.TRACE_ENABLED,
+            'traces': sync_trace.get_trace_store().list()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/sync/traces/<name>', methods=['GET'])
+@require_auth
+def get_sync_trace(name):
+    """
+    Download one trace bundle as a zip.
+    Optional query parameter: part=trace (the JSON only) or part=screenshot.
+    """
+    try:
+        store = sync_trace.get_trace_store()
+        path = store.path(name)
+        if not path:
+            return jsonify({
+                'success': False,
+                'error': 'Trace not found'
+            }), 404
+        
+        part = request.args.get('part')
+        if part:
+            if part not in ('trace', 'screenshot'):
+                return jsonify({
+                    'success': False,
+                    'error': 'part must be trace or screenshot'
+                }), 400
+            member, mimetype = ('trace.json', 'application/json') if part == 'trace' \
+                else ('screenshot.jpg', 'image/jpeg')
+            content = store.read(name, member)
+            if content is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Trace has no {part}'
+                }), 404
+            return Response(content, mimetype=mimetype)
+        
+        with open(path, 'rb') as bundle:
+            return Response(bundle.read(), mimetype='application/zip',
+                            headers={'Content-Disposition': f'attachment; filename={name}'})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@account_bp.route('/accounts/sync/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_sync_job(job_id):
+    """Get the progress of one sync job"""
+    try:
+        job = get_sync_queue().get(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job': job.to_dict()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
@@ -0,0 +1,23 @@
+import os
+import hmac
+from flask import Blueprint, Response, request
+from src.services.metrics import registry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# Optional bearer token for scrapers; the endpoint is open when unset
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Sync phase timings and outcome counters in the Prometheus text format"""
+    if METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f"Bearer {METRICS_TOKEN}"):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE,
+                    headers={'Cache-Control': 'no-store'})
@@ -0,0 +1,29 @@
+"""
+Scheduler-only process: runs the account scheduler without serving HTTP.
+
+    python -m src.scheduler_main
+
+Use it for headless deployments, or run the web process with
+SCHEDULER_ROLE=off next to it. Status changes made here are not seen by a
+web process's /api/accounts/events stream (it only publishes its own
+commits), so with the dashboard in use, keep the scheduler in the web
+process (the default). Should both run a scheduler anyway, the account
+leases still keep them from syncing the same account at the same time.
+"""
+import threading
+from src.main import create_app
+
+
+def main():
+    app = create_app(scheduler_role='on')
+    try:
+        # The scheduler runs on daemon threads; keep the main thread alive
+        while not threading.Event().wait(3600):
+            pass
+    except KeyboardInterrupt:
+        pass
+    app.extensions['account_scheduler'].stop()
+
+
+if __name__ == '__main__':
+    main()
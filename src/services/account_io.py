@@ -0,0 +1,167 @@
+import io
+import csv
+import json
+from sqlalchemy.orm import load_only
+from src.models.account import ManusAccount, db
+
+# Rows inserted (and committed) per batch during import
+IMPORT_BATCH_SIZE = 500
+# Rows fetched per round trip during export
+EXPORT_BATCH_SIZE = 500
+# Invalid rows reported back in detail
+MAX_REPORTED_ERRORS = 50
+
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson'
+}
+
+
+def detect_format(requested, content_type):
+    """Pick csv or jsonl from an explicit format argument or the Content-Type"""
+    if requested:
+        return requested if requested in FORMATS else None
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or 'json-lines' in content_type:
+        return 'jsonl'
+    return None
+
+
+def _iter_csv(text_stream):
+    reader = csv.DictReader(text_stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _iter_jsonl(text_stream):
+    for line_num, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_num, None
+            continue
+        yield line_num, row if isinstance(row, dict) else None
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    def reject(self, line_num, reason):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_num, 'error': reason})
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'invalid': self.invalid,
+            'errors': self.errors
+        }
+
+
+def import_accounts(stream, fmt, on_batch=None):
+    """
+    Read email/password rows from a byte stream and insert new accounts in batches.
+    Emails already stored (or repeated in the upload) are skipped with one
+    IN query per batch. on_batch(account_ids) is called after each commit.
+    """
+    report = ImportReport()
+    # utf-8-sig drops the byte-order mark Excel puts in front of CSV headers
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    rows = _iter_csv(text_stream) if fmt == 'csv' else _iter_jsonl(text_stream)
+    seen = set()
+    batch = {}
+
+    def flush():
+        if not batch:
+            return
+        existing = {email for (email,) in db.session.query(ManusAccount.email)
+                    .filter(ManusAccount.email.in_(list(batch)))}
+        accounts = []
+        for email, password in batch.items():
+            if email in existing:
+                report.duplicates += 1
+                continue
+            account = ManusAccount(email=email, status='inactive')
+            account.set_password(password)
+            accounts.append(account)
+        batch.clear()
+
+        db.session.add_all(accounts)
+        db.session.flush()
+        # Read ids before commit expires the instances
+        ids = [account.id for account in accounts]
+        db.session.commit()
+        report.created += len(accounts)
+        # Drop the instances so memory stays flat for large uploads
+        db.session.expunge_all()
+        if on_batch and ids:
+            on_batch(ids)
+
+    for line_num, row in rows:
+        if row is None:
+            report.reject(line_num, 'Malformed row')
+            continue
+        email = row.get('email') or ''
+        password = row.get('password') or ''
+        if not isinstance(email, str) or not isinstance(password, str):
+            # JSON Lines can carry numbers, lists or objects here
+            report.reject(line_num, 'Email and password must be strings')
+            continue
+        email = email.strip()
+        if not email or not password:
+            report.reject(line_num, 'Email and password are required')
+            continue
+        if email in seen:
+            report.duplicates += 1
+            continue
+        seen.add(email)
+        batch[email] = password
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    flush()
+
+    return report
+
+
+def iter_export(fmt, query=None):
+    """Yield account metadata (never passwords or sessions) as CSV or JSON Lines"""
+    fields = ManusAccount.DICT_FIELDS
+    query = query if query is not None else ManusAccount.query
+    columns = [getattr(ManusAccount, name) for name in fields]
+    query = query.options(load_only(*columns)).order_by(ManusAccount.id)
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        writer.writeheader()
+        yield buffer.getvalue()
+
+    last_id = 0
+    while True:
+        # Keyset batches keep each round trip small and the session empty
+        accounts = query.filter(ManusAccount.id > last_id).limit(EXPORT_BATCH_SIZE).all()
+        if not accounts:
+            break
+        last_id = accounts[-1].id
+
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fields)
+            for account in accounts:
+                writer.writerow(account.to_dict())
+            yield buffer.getvalue()
+        else:
+            yield ''.join(json.dumps(account.to_dict()) + '\n' for account in accounts)
+        db.session.expunge_all()
@@ -0,0 +1,186 @@
+"""
+Account leases, so several instances can sync the same database.
+
+Before syncing an account an instance claims it by setting
+manus_accounts.lease_owner and lease_expires_at in one conditional UPDATE;
+only rows that are free, expired or already ours are taken, so two
+instances never get the same account. While it works, a keeper thread
+renews every lease the instance holds; the lease is released in the same
+commit as the sync result. If an instance dies its leases simply expire
+and the next claim by a peer takes the accounts over.
+
+Within an instance the scheduler and the sync queue share one owner, so
+the ids currently held are also tracked in memory; an account held by
+one of them cannot be claimed by the other until it is released.
+
+Lease times come from the instances' clocks, so keep SYNC_LEASE_TTL well
+above the expected clock skew between hosts.
+"""
+import os
+import threading
+from datetime import datetime, timedelta
+from src.models.account import ManusAccount, db
+from src.services.sync_runs import OWNER
+
+# A lease not renewed for this long is up for grabs
+LEASE_TTL = float(os.environ.get('SYNC_LEASE_TTL', '300'))
+# Renew held leases this often (a few times per TTL)
+RENEW_INTERVAL = float(os.environ.get('SYNC_LEASE_RENEW', str(LEASE_TTL / 3)))
+
+
+class AccountLeases:
+    """Claims, renews and releases account leases for one instance"""
+
+    def __init__(self, app, owner=None, ttl=None, renew_interval=None):
+        self.app = app
+        self.owner = owner or OWNER
+        self.ttl = LEASE_TTL if ttl is None else ttl
+        self.renew_interval = RENEW_INTERVAL if renew_interval is None else renew_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._held = set()  # account ids claimed and not yet released, in this process
+        # Notified whenever ids leave _held, for wait_released()
+        self._held_lock = threading.Condition()
+
+    def _free(self, now):
+        return db.or_(ManusAccount.lease_owner.is_(None),
+                      ManusAccount.lease_owner == self.owner,
+                      ManusAccount.lease_expires_at.is_(None),
+                      ManusAccount.lease_expires_at < now)
+
+    def claim(self, account_ids, now=None):
+        """Lease as many of account_ids as are free; returns the claimed ids (commits)"""
+        # Reserve the ids in memory first, so two threads of this process never share one
+        with self._held_lock:
+            account_ids = sorted(set(account_ids) - self._held)
+            self._held.update(account_ids)
+        if not account_ids:
+            return set()
+        claimed = set()
+        try:
+            self.start()
+            now = now or datetime.utcnow()
+            # The WHERE clause is re-checked under the row lock, so claims never overlap
+            ManusAccount.query.filter(ManusAccount.id.in_(account_ids), self._free(now)).update({
+                'lease_owner': self.owner,
+                'lease_expires_at': now + timedelta(seconds=self.ttl),
+                'lease_heartbeat_at': now,
+                # Leasing is not a change to the account itself
+                'updated_at': ManusAccount.updated_at
+            }, synchronize_session=False)
+            db.session.commit()
+            claimed = {account_id for (account_id,) in db.session.query(ManusAccount.id).filter(
+                ManusAccount.id.in_(account_ids), ManusAccount.lease_owner == self.owner)}
+            return claimed
+        finally:
+            with self._held_lock:
+                self._held.difference_update(set(account_ids) - claimed)
+                self._held_lock.notify_all()
+
+    def release(self, account_ids):
+        """Give up leases on account_ids, if still ours (caller commits)"""
+        account_ids = list(account_ids)
+        if not account_ids:
+            return
+        with self._held_lock:
+            self._held.difference_update(account_ids)
+            self._held_lock.notify_all()
+        ManusAccount.query.filter(ManusAccount.id.in_(account_ids),
+                                  ManusAccount.lease_owner == self.owner).update({
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'lease_heartbeat_at': None,
+            'updated_at': ManusAccount.updated_at
+        }, synchronize_session=False)
+
+    def renew(self, now=None):
+        """Extend every lease this instance holds; returns how many (commits)"""
+        now = now or datetime.utcnow()
+        renewed = ManusAccount.query.filter(ManusAccount.lease_owner == self.owner).update({
+            'lease_expires_at': now + timedelta(seconds=self.ttl),
+            'lease_heartbeat_at': now,
+            'updated_at': ManusAccount.updated_at
+        }, synchronize_session=False)
+        db.session.commit()
+        return renewed
+
+    def held_here(self, account_id):
+        """Whether this process (e.g. its scheduler) holds the lease on account_id"""
+        with self._held_lock:
+            return account_id in self._held
+
+    def wait_released(self, account_id, timeout):
+        """Wait until this process no longer holds account_id; False on timeout"""
+        with self._held_lock:
+            return self._held_lock.wait_for(lambda: account_id not in self._held, timeout)
+
+    def leased_until(self, account_ids):
+        """{account_id: lease expiry} for accounts leased by other instances or held in this one"""
+        with self._held_lock:
+            held = [account_id for account_id in account_ids if account_id in self._held]
+        rows = db.session.query(ManusAccount.id, ManusAccount.lease_expires_at).filter(
+            ManusAccount.id.in_(list(account_ids)),
+            ManusAccount.lease_owner.isnot(None),
+            db.or_(ManusAccount.lease_owner != self.owner, ManusAccount.id.in_(held))).all()
+        return {account_id: expires for account_id, expires in rows}
+
+    def start(self):
+        """Start the renewal thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._keep, name='lease-keeper')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop renewing and release everything still held"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=5)
+        with self._held_lock:
+            self._held.clear()
+            self._held_lock.notify_all()
+        with self.app.app_context():
+            try:
+                ManusAccount.query.filter(ManusAccount.lease_owner == self.owner).update({
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'lease_heartbeat_at': None,
+                    'updated_at': ManusAccount.updated_at
+                }, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error releasing account leases: {str(e)}")
+
+    def _keep(self):
+        while not self._stop.wait(self.renew_interval):
+            with self.app.app_context():
+                try:
+                    self.renew()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error renewing account leases: {str(e)}")
+
+
+_leases = None
+_leases_lock = threading.Lock()
+
+
+def get_account_leases(app=None):
+    """Process-wide leases shared by the scheduler and the sync queue"""
+    global _leases
+    with _leases_lock:
+        if _leases is None:
+            if app is None:
+                from flask import current_app
+                app = current_app._get_current_object()
+            _leases = AccountLeases(app)
+        return _leases
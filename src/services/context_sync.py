@@ -0,0 +1,398 @@
+"""
+Sync mode that runs every account in its own browser context of a single
+headless Chrome (SYNC_MODE=contexts).
+
+A browser context is Chrome's incognito-style profile: cookies, storage
+and cache are isolated per context, but all contexts share one browser
+process. Contexts are driven concurrently over the Chrome DevTools
+Protocol from a trio event loop, so N parallel accounts cost N tabs
+instead of N Chrome processes and N chromedriver sessions.
+The shared AIMD limit (SYNC_CONCURRENCY_MAX) still caps how many run at
+once, so raise it together with SYNC_MAX_CONTEXTS.
+"""
+import os
+import re
+import json
+import time
+from datetime import datetime
+import urllib3
+import trio
+from selenium.webdriver.common.bidi import cdp
+from src.services import metrics
+from src.services.driver_pool import create_chrome_driver
+from src.services.manus_service import (
+    BASE_URL, LOGIN_URL, EMAIL_SELECTOR, PASSWORD_SELECTOR, SUBMIT_SELECTOR, SUBMIT_XPATH,
+    ERROR_SELECTOR, LOGGED_IN_SELECTOR, ELEMENT_TIMEOUT, POST_SUBMIT_TIMEOUT, VERIFY_TIMEOUT,
+    POLL_INTERVAL, HTTP_VERIFY_ENABLED
+)
+from src.services.session_verifier import get_session_verifier
+from src.services.resource_blocking import PAGE_WEIGHT_JS, get_block_policy, observe_page_weight
+from src.services.sync_control import get_concurrency_limiter, get_circuit_breaker
+from src.services.sync_engine import (
+    SyncResult, DEFAULT_ACCOUNT_TIMEOUT, classify_result, record_result
+)
+
+# Browser contexts open at the same time in the shared Chrome
+DEFAULT_MAX_CONTEXTS = int(os.environ.get('SYNC_MAX_CONTEXTS', '8'))
+
+_EMAIL_PRESENT_JS = f"document.querySelector({json.dumps(EMAIL_SELECTOR)}) !== null"
+
+# React-style inputs only notice values set through the native setter plus an input event
+_FILL_AND_SUBMIT_JS = """(() => {
+  const setValue = (el, value) => {
+    const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+    setter.call(el, value);
+    el.dispatchEvent(new Event('input', {bubbles: true}));
+    el.dispatchEvent(new Event('change', {bubbles: true}));
+  };
+  const email = document.querySelector(%(email_selector)s);
+  const password = document.querySelector(%(password_selector)s);
+  if (!email || !password) return 'Login form not found';
+  setValue(email, %(email)s);
+  setValue(password, %(password)s);
+  let button = document.querySelector(%(submit_selector)s);
+  if (!button) {
+    button = document.evaluate(%(submit_xpath)s, document, null,
+                               XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  }
+  if (!button) return 'Login button not found';
+  button.click();
+  return null;
+})()"""
+
+# Same decisions as manus_service._login_outcome / _session_outcome, in the page
+_LOGIN_OUTCOME_JS = """(() => {
+  const url = location.href.toLowerCase();
+  if (!url.includes('login') && !url.includes('error')) return {state: 'redirected', url: location.href};
+  for (const el of document.querySelectorAll(%(error_selector)s)) {
+    const text = (el.innerText || '').trim();
+    if (text && el.offsetParent !== null) return {state: 'error', message: text, url: location.href};
+  }
+  return null;
+})()""" % {'error_selector': json.dumps(ERROR_SELECTOR)}
+
+_SESSION_OUTCOME_JS = """(() => {
+  if (location.href.toLowerCase().includes('login')) return 'expired';
+  if (document.querySelector(%(logged_in_selector)s)) return 'valid';
+  return null;
+})()""" % {'logged_in_selector': json.dumps(LOGGED_IN_SELECTOR)}
+
+
+def cdp_endpoint(driver):
+    """(major browser version, browser websocket URL) of a local Chrome driver"""
+    address = driver.caps.get('goog:chromeOptions', {}).get('debuggerAddress')
+    if not address:
+        raise RuntimeError("Chrome did not report a debugger address")
+    response = urllib3.PoolManager().request('GET', f"http://{address}/json/version")
+    data = json.loads(response.data)
+    version = re.search(r'/(\d+)\.', data.get('Browser', '')).group(1)
+    return version, data['webSocketDebuggerUrl']
+
+
+class CdpPage:
+    """One tab in its own browser context, driven over a shared CDP connection"""
+
+    def __init__(self, conn, devtools, context_id, session):
+        self.conn = conn
+        self.devtools = devtools
+        self.context_id = context_id
+        self.session = session
+        self._intercept_scope = None
+
+    @classmethod
+    async def open(cls, conn, devtools, nursery=None, policy=None):
+        target = devtools.target
+        context_id = await conn.execute(target.create_browser_context(dispose_on_detach=True))
+        target_id = await conn.execute(target.create_target('about:blank', browser_context_id=context_id))
+        session = await conn.connect_session(target_id)
+        page = cls(conn, devtools, context_id, session)
+
+        policy = policy or get_block_policy()
+        if nursery is not None and policy.enabled:
+            # Listen before enabling so no paused request is missed
+            await nursery.start(page._intercept, policy)
+            await session.execute(devtools.fetch.enable(patterns=policy.fetch_patterns(devtools)))
+        return page
+
+    async def _intercept(self, policy, task_status=trio.TASK_STATUS_IGNORED):
+        """Answer Fetch.requestPaused events for this tab until the page is closed"""
+        with trio.CancelScope() as scope:
+            self._intercept_scope = scope
+            events = self.session.listen(self.devtools.fetch.RequestPaused, buffer_size=64)
+            task_status.started()
+            async for event in events:
+                try:
+                    await self.session.execute(policy.decide(self.devtools, event))
+                except Exception as e:
+                    print(f"Request interception failed: {e}")
+
+    async def close(self):
+        if self._intercept_scope is not None:
+            self._intercept_scope.cancel()
+        # Disposing the context closes its tab and drops its cookies and storage
+        await self.conn.execute(self.devtools.target.dispose_browser_context(self.context_id))
+
+    async def page_weight(self):
+        return await self.evaluate(f"(() => {{{PAGE_WEIGHT_JS}}})()")
+
+    async def navigate(self, url):
+        await self.session.execute(self.devtools.page.navigate(url))
+
+    async def evaluate(self, expression):
+        remote, exception = await self.session.execute(
+            self.devtools.runtime.evaluate(expression, return_by_value=True))
+        if exception is not None:
+            return None
+        return remote.value
+
+    async def wait_for(self, expression, timeout):
+        """Poll expression until it is truthy; None on timeout"""
+        with trio.move_on_after(timeout):
+            while True:
+                try:
+                    value = await self.evaluate(expression)
+                except cdp.BrowserError:
+                    # The execution context goes away while a navigation commits
+                    value = None
+                if value:
+                    return value
+                await trio.sleep(POLL_INTERVAL)
+        return None
+
+    async def email_field_present(self, timeout):
+        return bool(await self.wait_for(_EMAIL_PRESENT_JS, timeout))
+
+    async def fill_and_submit(self, email, password):
+        """None once the form was submitted, otherwise what was missing"""
+        return await self.evaluate(_FILL_AND_SUBMIT_JS % {
+            'email_selector': json.dumps(EMAIL_SELECTOR),
+            'password_selector': json.dumps(PASSWORD_SELECTOR),
+            'submit_selector': json.dumps(SUBMIT_SELECTOR),
+            'submit_xpath': json.dumps(SUBMIT_XPATH),
+            'email': json.dumps(email),
+            'password': json.dumps(password),
+        })
+
+    async def login_outcome(self, timeout):
+        return await self.wait_for(_LOGIN_OUTCOME_JS, timeout)
+
+    async def session_outcome(self, timeout):
+        return await self.wait_for(_SESSION_OUTCOME_JS, timeout)
+
+    async def get_cookies(self):
+        """Cookies of this context in the Selenium get_cookies() format"""
+        cookies = await self.conn.execute(self.devtools.storage.get_cookies(browser_context_id=self.context_id))
+        result = []
+        for cookie in cookies:
+            item = {'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain,
+                    'path': cookie.path, 'secure': cookie.secure, 'httpOnly': cookie.http_only}
+            if not cookie.session:
+                item['expiry'] = int(cookie.expires)
+            if cookie.same_site is not None:
+                item['sameSite'] = cookie.same_site.to_json()
+            result.append(item)
+        return result
+
+    async def set_cookies(self, cookies):
+        network = self.devtools.network
+        params = []
+        for cookie in cookies:
+            if 'name' not in cookie or 'value' not in cookie:
+                continue
+            params.append(network.CookieParam(
+                name=cookie['name'], value=cookie['value'],
+                url=None if cookie.get('domain') else BASE_URL,
+                domain=cookie.get('domain'), path=cookie.get('path', '/'),
+                secure=cookie.get('secure'), http_only=cookie.get('httpOnly'),
+                expires=network.TimeSinceEpoch(cookie['expiry']) if cookie.get('expiry') else None
+            ))
+        if params:
+            await self.conn.execute(self.devtools.storage.set_cookies(params, browser_context_id=self.context_id))
+
+
+class ContextSyncEngine:
+    """
+    Drop-in for SyncEngine: run(jobs, on_result) syncs accounts concurrently
+    as browser contexts of one Chrome, kept warm between runs.
+    """
+
+    def __init__(self, max_workers=None, account_timeout=None, driver_factory=None,
+                 page_factory=None, limiter=None, breaker=None, http_verifier=None):
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_CONTEXTS)
+        self.account_timeout = account_timeout or DEFAULT_ACCOUNT_TIMEOUT
+        # Context syncs are not traced, and this browser lives across runs; keep its log off
+        self.driver_factory = driver_factory or (lambda: create_chrome_driver(performance_log=False))
+        self.page_factory = page_factory or CdpPage.open
+        self.limiter = limiter
+        self.breaker = breaker
+        self.http_verifier = http_verifier
+        self.service_factory = None  # interface parity with SyncEngine; contexts need no service
+        self._driver = None
+        self._endpoint = None
+        self._broken = False
+        self._nursery = None  # of the current run; hosts the request interception tasks
+
+    def _ensure_browser(self):
+        if self._driver is not None and self._broken:
+            self.close()
+        if self._driver is None:
+            self._driver = self.driver_factory()
+            self._endpoint = cdp_endpoint(self._driver)
+            self._broken = False
+        return self._endpoint
+
+    def close(self):
+        """Quit the shared browser"""
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except Exception:
+                pass
+        self._driver = None
+        self._endpoint = None
+
+    def run(self, jobs, on_result=None, on_abandoned_done=None):
+        """
+        Sync all jobs and return their results.
+        The trio loop runs on the calling thread, so on_result may touch
+        the database session just like with SyncEngine. Timed-out syncs are
+        cancelled rather than abandoned, so on_abandoned_done is never called.
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        results = []
+        try:
+            version, ws_url = self._ensure_browser()
+            trio.run(self._run_all, version, ws_url, jobs, results, on_result)
+        except Exception as e:
+            # Browser or CDP connection failed outright; report what did not finish
+            self._broken = True
+            print(f"Context sync run failed: {e}")
+            finished = {result.account_id for result in results}
+            for job in jobs:
+                if job.account_id not in finished:
+                    result = SyncResult(job.account_id, job.email, False,
+                                        message=f"Failed to setup browser driver: {str(e)}")
+                    record_result(result)
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+        return results
+
+    async def _run_all(self, version, ws_url, jobs, results, on_result):
+        devtools = cdp.import_devtools(version)
+        capacity = trio.CapacityLimiter(self.max_workers)
+        async with cdp.open_cdp(ws_url) as conn:
+            async with trio.open_nursery() as nursery:
+                self._nursery = nursery
+                for job in jobs:
+                    nursery.start_soon(self._run_job, conn, devtools, job, capacity, results, on_result)
+
+    async def _run_job(self, conn, devtools, job, capacity, results, on_result):
+        limiter = self.limiter or get_concurrency_limiter()
+        breaker = self.breaker or get_circuit_breaker()
+        async with capacity:
+            # The shared AIMD limit also covers the thread-based sync queue
+            while not limiter.acquire(timeout=0):
+                await trio.sleep(0.05)
+            kind, latency = None, None
+            try:
+                if not breaker.allow():
+                    result = SyncResult(job.account_id, job.email, False, skipped=True,
+                                        message="Skipped: upstream circuit open, logins paused")
+                else:
+                    started = time.monotonic()
+                    result = None
+                    with trio.move_on_after(self.account_timeout):
+                        result = await self._sync(conn, devtools, job)
+                    if result is None:
+                        result = SyncResult(job.account_id, job.email, False, timed_out=True,
+                                            message=f"Sync timeout after {self.account_timeout:.0f}s")
+                    result.duration = time.monotonic() - started
+                    kind, latency = classify_result(result), result.duration
+                    breaker.record(kind)
+            finally:
+                limiter.release(latency, kind)
+
+        record_result(result)
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    async def _sync(self, conn, devtools, job):
+        if not job.password:
+            return SyncResult(job.account_id, job.email, False, message='No password found')
+
+        try:
+            if job.session_data and job.session_data.get('cookies'):
+                if await self._verify(conn, devtools, job):
+                    return SyncResult(job.account_id, job.email, True, job.session_data,
+                                      "Session still valid", path='verified')
+            success, session_data, message = await self._login(conn, devtools, job)
+            return SyncResult(job.account_id, job.email, success, session_data, message, path='relogin')
+        except cdp.CdpConnectionClosed as e:
+            # Chrome went away; start a fresh one on the next run
+            self._broken = True
+            return SyncResult(job.account_id, job.email, False, message=f"Login error: {str(e)}")
+        except Exception as e:
+            return SyncResult(job.account_id, job.email, False, message=f"Login error: {str(e)}")
+
+    async def _verify(self, conn, devtools, job):
+        """True if the stored session is still valid"""
+        if self.http_verifier is None and HTTP_VERIFY_ENABLED:
+            self.http_verifier = get_session_verifier()
+        if self.http_verifier is not None:
+            with metrics.phase('verify_http'):
+                is_valid, _ = await trio.to_thread.run_sync(self.http_verifier.verify, job.session_data)
+            if is_valid is not None:
+                return is_valid
+
+        with metrics.phase('verify_browser'):
+            page = await self.page_factory(conn, devtools, self._nursery)
+            try:
+                # Cookies go in before the first request, so one navigation is enough
+                await page.set_cookies(job.session_data['cookies'])
+                await page.navigate(BASE_URL)
+                return await page.session_outcome(VERIFY_TIMEOUT) == 'valid'
+            finally:
+                await self._close_page(page)
+
+    async def _close_page(self, page):
+        # Runs even when the account timeout cancelled the sync
+        with trio.CancelScope(shield=True):
+            try:
+                await page.close()
+            except Exception as e:
+                print(f"Failed to close browser context: {e}")
+
+    async def _login(self, conn, devtools, job):
+        page = await self.page_factory(conn, devtools, self._nursery)
+        try:
+            with metrics.phase('navigate'):
+                await page.navigate(LOGIN_URL)
+                if not await page.email_field_present(ELEMENT_TIMEOUT):
+                    return False, {}, "Login timeout - page elements not found"
+            observe_page_weight(await page.page_weight(), 'login')
+
+            with metrics.phase('form_fill'):
+                problem = await page.fill_and_submit(job.email, job.password)
+            if problem:
+                return False, {}, problem
+
+            with metrics.phase('post_submit_wait'):
+                outcome = await page.login_outcome(POST_SUBMIT_TIMEOUT)
+            if not outcome:
+                return False, {}, "Login failed - unknown error"
+            if outcome['state'] != 'redirected':
+                return False, {}, outcome.get('message') or "Login failed - unknown error"
+
+            with metrics.phase('cookie_capture'):
+                cookies = await page.get_cookies()
+            return True, {
+                'cookies': cookies,
+                'url': outcome['url'],
+                'timestamp': datetime.utcnow().isoformat()
+            }, "Login successful"
+        finally:
+            await self._close_page(page)
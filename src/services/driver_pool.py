@@ -0,0 +1,253 @@
+import os
+import time
+import atexit
+import threading
+from urllib.parse import urlsplit
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from src.services.resource_blocking import RequestBlocker, get_block_policy
+from src.services.sync_trace import enable_performance_log, discard_performance_log
+
+# Pool sizing and lifetime, overridable from the environment
+DEFAULT_MIN_SIZE = int(os.environ.get('DRIVER_POOL_MIN', '0'))
+DEFAULT_MAX_SIZE = int(os.environ.get('DRIVER_POOL_MAX', '4'))
+DEFAULT_IDLE_TIMEOUT = float(os.environ.get('DRIVER_POOL_IDLE_TIMEOUT', '300'))
+DEFAULT_MAX_USES = int(os.environ.get('DRIVER_POOL_MAX_USES', '50'))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.environ.get('DRIVER_POOL_ACQUIRE_TIMEOUT', '120'))
+# Origins whose storage (IndexedDB, cache storage, service workers...) is wiped between leases,
+# in addition to the page's own; MANUS_BASE_URL plus any comma-separated DRIVER_POOL_CLEAR_ORIGINS
+CLEAR_ORIGINS = [origin.strip().rstrip('/') for origin in
+                 [os.environ.get('MANUS_BASE_URL', 'https://manus.chat')] +
+                 os.environ.get('DRIVER_POOL_CLEAR_ORIGINS', '').split(',') if origin.strip()]
+
+
+def build_chrome_options(headless=True, user_data_dir=None, performance_log=True):
+    """Chrome options shared by every pooled driver"""
+    chrome_options = Options()
+    if user_data_dir:
+        # Persistent per-account profile; keep the HTTP cache out of it
+        chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+        chrome_options.add_argument("--disk-cache-size=1")
+    if headless:
+        chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+    # Network events for sync traces, when they are enabled
+    return enable_performance_log(chrome_options) if performance_log else chrome_options
+
+
+def create_chrome_driver(headless=True, user_data_dir=None, performance_log=True):
+    driver = webdriver.Chrome(options=build_chrome_options(headless, user_data_dir, performance_log))
+    # Skip images, fonts, media and trackers the login never needs
+    RequestBlocker(driver, get_block_policy()).install()
+    return driver
+
+
+class PooledDriver:
+    """A driver plus the bookkeeping the pool needs"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.uses = 0
+
+
+class DriverPool:
+    """
+    Keeps warm Chrome drivers around between logins.
+    Drivers are leased with acquire() and handed back with release(); state
+    is wiped on release so no cookies leak from one account to the next.
+    """
+
+    def __init__(self, min_size=None, max_size=None, idle_timeout=None, max_uses=None,
+                 driver_factory=None, headless=True):
+        self.min_size = DEFAULT_MIN_SIZE if min_size is None else min_size
+        self.max_size = max(1, DEFAULT_MAX_SIZE if max_size is None else max_size)
+        self.idle_timeout = DEFAULT_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_uses = DEFAULT_MAX_USES if max_uses is None else max_uses
+        self.driver_factory = driver_factory or (lambda: create_chrome_driver(headless))
+
+        self._idle = []
+        self._leased = {}
+        self._creating = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._reaper = None
+
+    @property
+    def size(self):
+        with self._cond:
+            return len(self._idle) + len(self._leased) + self._creating
+
+    def start(self):
+        """Pre-warm min_size drivers and start the idle reaper"""
+        for _ in range(self.min_size):
+            pooled = self._create()
+            if pooled:
+                with self._cond:
+                    self._idle.append(pooled)
+                    self._cond.notify()
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap_loop, name='driver-pool-reaper')
+            self._reaper.daemon = True
+            self._reaper.start()
+        return self
+
+    def acquire(self, timeout=None):
+        """Lease a healthy driver, waiting if the pool is at max_size"""
+        timeout = DEFAULT_ACQUIRE_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            pooled = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    if self._idle:
+                        # Most recently used first keeps the rest idle long enough to evict
+                        pooled = self._idle.pop()
+                        break
+                    if len(self._leased) + self._creating < self.max_size:
+                        self._creating += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a browser driver")
+                    self._cond.wait(remaining)
+
+            if pooled is None:
+                try:
+                    pooled = self._create()
+                finally:
+                    with self._cond:
+                        self._creating -= 1
+                        self._cond.notify()
+                if pooled is None:
+                    raise RuntimeError("Failed to start browser driver")
+            elif not self._is_healthy(pooled):
+                self._destroy(pooled)
+                continue
+
+            pooled.uses += 1
+            with self._cond:
+                self._leased[id(pooled.driver)] = pooled
+            return pooled.driver
+
+    def release(self, driver, discard=False):
+        """Return a leased driver; it is reset before being reused"""
+        with self._cond:
+            pooled = self._leased.pop(id(driver), None)
+        if pooled is None:
+            self._quit(driver)
+            return
+
+        if not discard and pooled.uses < self.max_uses and self._reset(pooled):
+            pooled.last_used = time.monotonic()
+            with self._cond:
+                if not self._closed:
+                    self._idle.append(pooled)
+                    self._cond.notify()
+                    return
+        self._destroy(pooled)
+
+    def evict_idle(self):
+        """Quit drivers idle longer than idle_timeout, keeping min_size"""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            keep = []
+            total = len(self._idle) + len(self._leased)
+            # Oldest idle drivers sit at the front of the list
+            for pooled in self._idle:
+                if now - pooled.last_used > self.idle_timeout and total > self.min_size:
+                    expired.append(pooled)
+                    total -= 1
+                else:
+                    keep.append(pooled)
+            self._idle = keep
+        for pooled in expired:
+            self._destroy(pooled)
+        return len(expired)
+
+    def close(self):
+        """Quit every idle driver; leased drivers are quit when released"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._destroy(pooled)
+
+    def _reap_loop(self):
+        interval = max(1.0, min(self.idle_timeout / 2, 60.0))
+        while not self._closed:
+            time.sleep(interval)
+            try:
+                self.evict_idle()
+            except Exception as e:
+                print(f"Driver pool eviction failed: {e}")
+
+    def _create(self):
+        try:
+            return PooledDriver(self.driver_factory())
+        except Exception as e:
+            print(f"Failed to setup driver: {e}")
+            return None
+
+    def _is_healthy(self, pooled):
+        try:
+            pooled.driver.current_url
+            return bool(pooled.driver.window_handles)
+        except Exception:
+            return False
+
+    def _reset(self, pooled):
+        """Clear cookies, storage and caches browser-wide so the next lease starts clean"""
+        driver = pooled.driver
+        try:
+            origins = set(CLEAR_ORIGINS)
+            parts = urlsplit(driver.current_url)
+            if parts.scheme in ('http', 'https'):
+                origins.add(f"{parts.scheme}://{parts.netloc}")
+            # delete_all_cookies() and localStorage only reach the current document's
+            # origin; these cover every host's cookies and the sites' other storage
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+            for origin in sorted(origins):
+                driver.execute_cdp_cmd('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+            driver.get("about:blank")
+            # Unsampled leases never read the trace log; don't let it pile up across leases
+            discard_performance_log(driver)
+            return True
+        except Exception as e:
+            # A driver that cannot be wiped is discarded rather than handed to another account
+            print(f"Failed to reset driver: {e}")
+            return False
+
+    def _destroy(self, pooled):
+        self._quit(pooled.driver)
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """Process-wide driver pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriverPool().start()
+            atexit.register(_pool.close)
+        return _pool
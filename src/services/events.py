@@ -0,0 +1,145 @@
+import os
+import json
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.account import ManusAccount
+
+# Events kept for Last-Event-ID replay
+DEFAULT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', '1000'))
+# Events a slow subscriber may fall behind before it is dropped
+SUBSCRIBER_QUEUE_SIZE = 500
+
+_PENDING_KEY = 'account_status_events'
+
+
+class Event:
+    def __init__(self, event_id, event_type, data):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+
+    def to_sse(self):
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class Subscription:
+    def __init__(self, bus):
+        self.bus = bus
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        """Next event, or None on timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process pub/sub with a bounded ring buffer for replay"""
+
+    def __init__(self, buffer_size=None):
+        self._buffer = deque(maxlen=buffer_size or DEFAULT_BUFFER_SIZE)
+        self._subscribers = set()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        with self._lock:
+            return self._next_id - 1
+
+    def publish(self, event_type, data):
+        with self._lock:
+            evt = Event(self._next_id, event_type, data)
+            self._next_id += 1
+            self._buffer.append(evt)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(evt)
+            except queue.Full:
+                # Drop the slow client; it will reconnect and replay
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+        return evt
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns (subscription, replay) where replay holds the buffered events
+        after last_event_id, or None if they are no longer all buffered.
+        """
+        subscription = Subscription(self)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is None:
+                return subscription, []
+            oldest = self._buffer[0].id if self._buffer else self._next_id
+            if last_event_id >= self._next_id or last_event_id < oldest - 1:
+                return subscription, None
+            return subscription, [evt for evt in self._buffer if evt.id > last_event_id]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+account_events = EventBus()
+
+
+def _collect_status_changes(session, flush_context):
+    """Remember status transitions flushed in this transaction"""
+    pending = session.info.setdefault(_PENDING_KEY, [])
+    # New accounts are announced together, one event per flush (an import
+    # batch inserts hundreds); clients reload the list once for all of them
+    created = [obj.id for obj in session.new if isinstance(obj, ManusAccount)]
+    if created:
+        pending.append(('created', {'account_ids': sorted(created), 'count': len(created)}))
+    for obj in session.dirty:
+        if not isinstance(obj, ManusAccount):
+            continue
+        history = inspect(obj).attrs.status.history
+        if not history.added:
+            continue
+        old_status = history.deleted[0] if history.deleted else None
+        new_status = history.added[0]
+        if old_status == new_status:
+            continue
+        pending.append(('status', {
+            'account_id': obj.id,
+            'email': obj.email,
+            'old_status': old_status,
+            'status': new_status,
+            'last_login': obj.last_login.isoformat() if obj.last_login else None,
+            'updated_at': (obj.updated_at or datetime.utcnow()).isoformat()
+        }))
+    for obj in session.deleted:
+        if isinstance(obj, ManusAccount):
+            pending.append(('deleted', {'account_id': obj.id, 'email': obj.email}))
+
+
+def _publish_status_changes(session):
+    for event_type, data in session.info.pop(_PENDING_KEY, []):
+        account_events.publish(event_type, data)
+
+
+def _discard_status_changes(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install_status_events():
+    """Publish ManusAccount status transitions once they are committed"""
+    if event.contains(Session, 'after_flush', _collect_status_changes):
+        return
+    event.listen(Session, 'after_flush', _collect_status_changes)
+    event.listen(Session, 'after_commit', _publish_status_changes)
+    event.listen(Session, 'after_soft_rollback', _discard_status_changes)
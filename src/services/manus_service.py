@@ -1,98 +1,266 @@
+import os
 import time
 import json
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from datetime import datetime
+from src.services.driver_pool import get_driver_pool, create_chrome_driver
+from src.services.profile_cache import get_profile_cache
+from src.services.session_verifier import get_session_verifier
+from src.services.metrics import phase
+from src.services.resource_blocking import record_page_weight
+from src.services.sync_trace import SyncTrace
+
+# Overridable so the offline benchmarks can point a browser at a local stub site
+BASE_URL = os.environ.get('MANUS_BASE_URL', "https://manus.chat").rstrip('/')
+LOGIN_URL = BASE_URL + "/login"
+
+EMAIL_SELECTOR = "input[type='email'], input[name='email'], input[placeholder*='email' i]"
+PASSWORD_SELECTOR = "input[type='password'], input[name='password']"
+SUBMIT_SELECTOR = "button[type='submit']"
+SUBMIT_XPATH = "//button[contains(., 'Login') or contains(., 'Sign in')]"
+ERROR_SELECTOR = ".error, .alert-danger, [class*='error']"
+LOGGED_IN_SELECTOR = "[class*='user'], [class*='profile'], [class*='dashboard'], [class*='account']"
+
+# Per-step wait timeouts (seconds)
+ELEMENT_TIMEOUT = float(os.environ.get('MANUS_ELEMENT_TIMEOUT', '10'))
+POST_SUBMIT_TIMEOUT = float(os.environ.get('MANUS_POST_SUBMIT_TIMEOUT', '15'))
+VERIFY_TIMEOUT = float(os.environ.get('MANUS_VERIFY_TIMEOUT', '10'))
+# Total wall time allowed for one account (verify + login)
+DEFAULT_LATENCY_BUDGET = float(os.environ.get('MANUS_LATENCY_BUDGET', '60'))
+# Try the browser-less cookie check before starting Chrome
+HTTP_VERIFY_ENABLED = os.environ.get('MANUS_HTTP_VERIFY', '1') != '0'
+POLL_INTERVAL = 0.1
+
+
+class LatencyBudgetExceeded(TimeoutException):
+    pass
+
+
+def _login_outcome(driver):
+    """Wait condition: 'redirected' once we left the login page, 'error' once an error is shown"""
+    current_url = driver.current_url.lower()
+    if "login" not in current_url and "error" not in current_url:
+        return 'redirected'
+    for element in driver.find_elements(By.CSS_SELECTOR, ERROR_SELECTOR):
+        if element.is_displayed() and element.text.strip():
+            return 'error'
+    return False
+
+
+def _session_outcome(driver):
+    """Wait condition: 'expired' when bounced to login, 'valid' when a logged-in marker shows up"""
+    if "login" in driver.current_url.lower():
+        return 'expired'
+    if driver.find_elements(By.CSS_SELECTOR, LOGGED_IN_SELECTOR):
+        return 'valid'
+    return False
+
 
 class ManusService:
-    def __init__(self):
+    def __init__(self, pool=None, latency_budget=None, http_verifier=None, profile_cache=None,
+                 profile_driver_factory=None):
         self.driver = None
         self.wait = None
+        self.pool = pool
+        self.http_verifier = http_verifier
+        self.latency_budget = DEFAULT_LATENCY_BUDGET if latency_budget is None else latency_budget
+        self._deadline = None
+        self._discard_driver = False
+        self.last_path = None  # 'verified' or 'relogin' after refresh_session
+        # Optional per-account Chrome profiles (MANUS_PROFILE_CACHE=1)
+        self.profile_cache = profile_cache if profile_cache is not None else get_profile_cache()
+        self.profile_driver_factory = profile_driver_factory or \
+            (lambda user_data_dir: create_chrome_driver(user_data_dir=user_data_dir))
+        self._profile = None
+        self._profile_driver = None
+        self.trace = None  # SyncTrace of a sampled refresh_session (SYNC_TRACE=1)
     
     def setup_driver(self, headless=True):
-        """Setup Chrome driver with appropriate options"""
-        chrome_options = Options()
-        if headless:
-            chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+        """Lease a warm Chrome driver from the shared pool"""
+        if self._profile is not None:
+            return self._setup_profile_driver()
+        
+        if self.pool is None:
+            self.pool = get_driver_pool()
         
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
-            self.wait = WebDriverWait(self.driver, 10)
+            with phase('driver_setup'):
+                self.driver = self.pool.acquire()
+            self.wait = WebDriverWait(self.driver, ELEMENT_TIMEOUT)
+            self._discard_driver = False
             return True
         except Exception as e:
             print(f"Failed to setup driver: {e}")
             return False
     
+    def release_driver(self):
+        """Hand the driver back to the pool (or drop it if it misbehaved)"""
+        if self.driver is not None and self.driver is self._profile_driver:
+            # Profile drivers live until the profile is closed, unless they misbehaved
+            if self._discard_driver:
+                self._quit_profile_driver()
+        elif self.driver:
+            self.pool.release(self.driver, discard=self._discard_driver)
+        self.driver = None
+        self.wait = None
+    
+    def _trace_attach(self):
+        if self.trace is not None:
+            self.trace.attach(self.driver)
+    
+    def _trace_capture(self, success):
+        """Snapshot the page for the trace before the driver is handed back"""
+        if self.trace is not None and self.driver is not None:
+            self.trace.capture(self.driver, success)
+    
+    def _open_profile(self, email):
+        """Lease this account's profile; without one the pooled drivers are used"""
+        if self.profile_cache is None:
+            return
+        self._profile = self.profile_cache.acquire(email)
+        if self._profile is None:
+            print(f"Profile for {email} is busy; using a pooled browser")
+    
+    def _setup_profile_driver(self):
+        try:
+            if self._profile_driver is None:
+                with phase('driver_setup'):
+                    self._profile_driver = self.profile_driver_factory(self._profile.path)
+            self.driver = self._profile_driver
+            self.wait = WebDriverWait(self.driver, ELEMENT_TIMEOUT)
+            self._discard_driver = False
+            return True
+        except Exception as e:
+            print(f"Failed to setup driver: {e}")
+            return False
+    
+    def _quit_profile_driver(self):
+        if self._profile_driver is not None:
+            try:
+                # Chrome writes cookies and storage back to the profile on exit
+                self._profile_driver.quit()
+            except Exception:
+                pass
+            self._profile_driver = None
+    
+    def _close_profile(self, keep):
+        if self._profile is None:
+            return
+        self._quit_profile_driver()
+        self._profile.release(keep=keep)
+        self._profile = None
+    
+    def _start_budget(self):
+        """Start the latency budget unless an outer call already did; returns True if we own it"""
+        if self._deadline is not None:
+            return False
+        self._deadline = time.monotonic() + self.latency_budget
+        return True
+    
+    def _remaining(self):
+        if self._deadline is None:
+            return float('inf')
+        return self._deadline - time.monotonic()
+    
+    def _wait_for(self, condition, timeout):
+        """Wait for condition, capped by what is left of the latency budget"""
+        remaining = self._remaining()
+        if remaining <= 0:
+            raise LatencyBudgetExceeded("Latency budget exhausted")
+        wait = WebDriverWait(self.driver, min(timeout, remaining), poll_frequency=POLL_INTERVAL,
+                             ignored_exceptions=(StaleElementReferenceException,))
+        return wait.until(condition)
+    
+    def _find_submit_button(self):
+        try:
+            return self.driver.find_element(By.CSS_SELECTOR, SUBMIT_SELECTOR)
+        except NoSuchElementException:
+            return self.driver.find_element(By.XPATH, SUBMIT_XPATH)
+    
     def login(self, email, password):
         """
         Attempt to login to Manus AI
         Returns: (success: bool, session_data: dict, error_message: str)
         """
+        owns_budget = self._start_budget()
         if not self.setup_driver():
+            if owns_budget:
+                self._deadline = None
             return False, {}, "Failed to setup browser driver"
+        self._trace_attach()
+        succeeded = False
         
         try:
-            # Navigate to Manus AI login page
-            self.driver.get("https://manus.chat/login")
-            time.sleep(2)
+            # Navigate to Manus AI login page and wait for the email field to render
+            with phase('navigate'):
+                self.driver.get(LOGIN_URL)
+                email_field = self._wait_for(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, EMAIL_SELECTOR)), ELEMENT_TIMEOUT
+                )
+            record_page_weight(self.driver, 'login')
             
-            # Find and fill email field
-            email_field = self.wait.until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='email'], input[name='email'], input[placeholder*='email' i]"))
-            )
-            email_field.clear()
-            email_field.send_keys(email)
-            
-            # Find and fill password field
-            password_field = self.driver.find_element(By.CSS_SELECTOR, "input[type='password'], input[name='password']")
-            password_field.clear()
-            password_field.send_keys(password)
-            
-            # Find and click login button
-            login_button = self.driver.find_element(By.CSS_SELECTOR, "button[type='submit'], button:contains('Login'), button:contains('Sign in')")
-            login_button.click()
+            with phase('form_fill'):
+                email_field.clear()
+                email_field.send_keys(email)
+                
+                # Find and fill password field
+                password_field = self.driver.find_element(By.CSS_SELECTOR, PASSWORD_SELECTOR)
+                password_field.clear()
+                password_field.send_keys(password)
+                
+                # Find and click login button
+                login_button = self._find_submit_button()
+                login_button.click()
             
-            # Wait for login to complete (check for redirect or success indicator)
-            time.sleep(5)
+            # Wait for a redirect away from the login page or an error message
+            with phase('post_submit_wait'):
+                try:
+                    self._wait_for(_login_outcome, POST_SUBMIT_TIMEOUT)
+                except LatencyBudgetExceeded:
+                    raise
+                except TimeoutException:
+                    # Fall through and judge the page as it is now
+                    pass
             
-            # Check if login was successful by looking for dashboard or profile elements
+            # Check if login was successful by looking at where we ended up
             current_url = self.driver.current_url
             if "login" not in current_url.lower() and "error" not in current_url.lower():
                 # Login appears successful, collect session data
-                cookies = self.driver.get_cookies()
+                with phase('cookie_capture'):
+                    cookies = self.driver.get_cookies()
                 session_data = {
                     'cookies': cookies,
                     'url': current_url,
                     'timestamp': datetime.utcnow().isoformat()
                 }
                 
+                succeeded = True
                 return True, session_data, "Login successful"
             else:
                 # Check for error messages
                 try:
-                    error_element = self.driver.find_element(By.CSS_SELECTOR, ".error, .alert-danger, [class*='error']")
+                    error_element = self.driver.find_element(By.CSS_SELECTOR, ERROR_SELECTOR)
                     error_message = error_element.text
                 except NoSuchElementException:
                     error_message = "Login failed - unknown error"
                 
                 return False, {}, error_message
-                
+        
+        except LatencyBudgetExceeded:
+            return False, {}, "Login timeout - latency budget exceeded"
         except TimeoutException:
             return False, {}, "Login timeout - page elements not found"
         except Exception as e:
+            self._discard_driver = True
             return False, {}, f"Login error: {str(e)}"
         finally:
-            if self.driver:
-                self.driver.quit()
+            self._trace_capture(succeeded)
+            self.release_driver()
+            if owns_budget:
+                self._deadline = None
     
     def verify_session(self, session_data):
         """
@@ -102,56 +270,97 @@ class ManusService:
         if not session_data or 'cookies' not in session_data:
             return False, "No session data available"
         
+        # Cheap HTTP check first; only start a browser if it can't tell
+        if self.http_verifier is None and HTTP_VERIFY_ENABLED:
+            self.http_verifier = get_session_verifier()
+        if self.http_verifier is not None:
+            with phase('verify_http'):
+                is_valid, message = self.http_verifier.verify(session_data)
+            if is_valid is not None:
+                return is_valid, message
+        
+        owns_budget = self._start_budget()
         if not self.setup_driver():
+            if owns_budget:
+                self._deadline = None
             return False, "Failed to setup browser driver"
+        self._trace_attach()
+        valid = False
         
         try:
-            # Navigate to Manus AI main page
-            self.driver.get("https://manus.chat")
-            
-            # Add stored cookies
-            for cookie in session_data['cookies']:
+            with phase('verify_browser'):
+                # Navigate to Manus AI main page
+                self.driver.get(BASE_URL)
+                
+                # A warm profile already carries the session; otherwise inject the stored cookies
+                if self._profile is None or not self._profile.warm:
+                    for cookie in session_data['cookies']:
+                        try:
+                            self.driver.add_cookie(cookie)
+                        except Exception as e:
+                            print(f"Failed to add cookie: {e}")
+                    
+                    # Refresh page to apply cookies
+                    self.driver.refresh()
+                
+                # Wait for either outcome
                 try:
-                    self.driver.add_cookie(cookie)
-                except Exception as e:
-                    print(f"Failed to add cookie: {e}")
+                    outcome = self._wait_for(_session_outcome, VERIFY_TIMEOUT)
+                except LatencyBudgetExceeded:
+                    raise
+                except TimeoutException:
+                    outcome = None
             
-            # Refresh page to apply cookies
-            self.driver.refresh()
-            time.sleep(3)
-            
-            # Check if we're logged in by looking for user-specific elements
-            current_url = self.driver.current_url
-            if "login" not in current_url.lower():
-                # Try to find user profile or dashboard elements
-                try:
-                    # Look for common logged-in indicators
-                    user_elements = self.driver.find_elements(By.CSS_SELECTOR, 
-                        "[class*='user'], [class*='profile'], [class*='dashboard'], [class*='account']")
-                    if user_elements:
-                        return True, "Session is valid"
-                except:
-                    pass
+            if outcome == 'valid':
+                valid = True
+                return True, "Session is valid"
             
             return False, "Session expired or invalid"
-            
+        
+        except LatencyBudgetExceeded:
+            return False, "Session verification timeout - latency budget exceeded"
         except Exception as e:
+            self._discard_driver = True
             return False, f"Session verification error: {str(e)}"
         finally:
-            if self.driver:
-                self.driver.quit()
+            # An invalid session falls through to login, which captures the final page
+            if valid:
+                self._trace_capture(True)
+            self.release_driver()
+            if owns_budget:
+                self._deadline = None
     
     def refresh_session(self, email, password, old_session_data=None):
         """
         Refresh session by logging in again
         Returns: (success: bool, session_data: dict, error_message: str)
         """
-        # First try to verify existing session
-        if old_session_data:
-            is_valid, _ = self.verify_session(old_session_data)
-            if is_valid:
-                return True, old_session_data, "Session still valid"
-        
-        # If session is invalid or doesn't exist, perform fresh login
-        return self.login(email, password)
-
+        # One budget covers both the verification and the fallback login
+        owns_budget = self._start_budget()
+        self._open_profile(email)
+        self.trace = SyncTrace.maybe_start(email)
+        success = False
+        message = None
+        try:
+            # First try to verify existing session
+            if old_session_data:
+                is_valid, _ = self.verify_session(old_session_data)
+                if is_valid:
+                    self.last_path = 'verified'
+                    success = True
+                    message = "Session still valid"
+                    return True, old_session_data, message
+            
+            # If session is invalid or doesn't exist, perform fresh login
+            self.last_path = 'relogin'
+            result = self.login(email, password)
+            success, message = result[0], result[2]
+            return result
+        finally:
+            if self.trace is not None:
+                self.trace.finish(success, message, self.last_path)
+                self.trace = None
+            # A profile that did not end logged in is not worth keeping
+            self._close_profile(keep=success)
+            if owns_budget:
+                self._deadline = None
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Seconds; covers a 50 ms HTTP check up to a multi-minute browser login
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+LOG_LEVEL = os.environ.get('SYNC_LOG_LEVEL', 'INFO').upper()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labels=()):
+        super().__init__(name, help_text, labels)
+        self._values = {}
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series[-1] if series else 0
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, series):
+                    labels = _format_labels(self.label_names, key, [('le', bound)])
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.label_names, key, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+sync_phase_seconds = registry.register(Histogram(
+    'manus_sync_phase_seconds', 'Time spent in each phase of an account sync', ['phase']))
+sync_account_seconds = registry.register(Histogram(
+    'manus_sync_account_seconds', 'Total time to sync one account', ['outcome', 'path']))
+sync_total = registry.register(Counter(
+    'manus_sync_total', 'Account syncs by outcome and path (verified, relogin)', ['outcome', 'path']))
+sync_phase_errors = registry.register(Counter(
+    'manus_sync_phase_errors_total', 'Phases that raised an exception', ['phase']))
+app_startup_seconds = registry.register(Gauge(
+    'manus_app_startup_seconds', 'Time create_app took in this process'))
+sync_concurrency_limit = registry.register(Gauge(
+    'manus_sync_concurrency_limit', 'Current adaptive limit on concurrent syncs'))
+sync_circuit_state = registry.register(Gauge(
+    'manus_sync_circuit_state', 'Sync circuit breaker state (0 closed, 1 half-open, 2 open)'))
+sync_circuit_trips = registry.register(Counter(
+    'manus_sync_circuit_trips_total', 'Times the sync circuit breaker opened'))
+blocked_requests = registry.register(Counter(
+    'manus_blocked_requests_total', 'Browser requests blocked by the resource policy', ['type']))
+page_transfer_bytes = registry.register(Histogram(
+    'manus_page_transfer_bytes', 'Bytes transferred to load a page and its resources', ['page', 'blocking'],
+    buckets=(50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 25e6)))
+page_load_seconds = registry.register(Histogram(
+    'manus_page_load_seconds', 'Time until the load event of a page', ['page', 'blocking']))
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra fields come from record.fields"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        data.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+logger = logging.getLogger('manus.sync')
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+_context = threading.local()
+
+
+def bind(**fields):
+    """Attach fields (e.g. account_id) to every log line and phase on this thread"""
+    _context.fields = dict(getattr(_context, 'fields', {}), **fields)
+    _context.phases = []
+
+
+def unbind():
+    _context.fields = {}
+    _context.phases = []
+
+
+def bound_fields():
+    """The fields bound on this thread"""
+    return dict(getattr(_context, 'fields', {}))
+
+
+def recorded_phases():
+    """(phase, start epoch, seconds) tuples recorded on this thread since bind()"""
+    return list(getattr(_context, 'phases', []))
+
+
+def log_event(event, level=logging.INFO, **fields):
+    if not logger.isEnabledFor(level):
+        return
+    merged = dict(getattr(_context, 'fields', {}), **fields)
+    logger.log(level, event, extra={'fields': merged})
+
+
+@contextmanager
+def phase(name):
+    """Time a sync phase into manus_sync_phase_seconds and the JSON log"""
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        sync_phase_errors.inc(phase=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        sync_phase_seconds.observe(elapsed, phase=name)
+        phases = getattr(_context, 'phases', None)
+        if phases is not None:
+            phases.append((name, started_at, elapsed))
+        log_event('phase', logging.DEBUG, phase=name, seconds=round(elapsed, 4),
+                  error=type(error).__name__ if error else None)
@@ -0,0 +1,225 @@
+import os
+import time
+import shutil
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+# Opt-in: keep a Chrome user-data-dir per account between syncs
+PROFILE_CACHE_ENABLED = os.environ.get('MANUS_PROFILE_CACHE', '0') == '1'
+DEFAULT_PROFILE_DIR = os.environ.get(
+    'MANUS_PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'profiles')
+)
+# Least recently used profiles are deleted beyond either limit
+DEFAULT_MAX_PROFILES = int(os.environ.get('MANUS_PROFILE_MAX_COUNT', '200'))
+DEFAULT_MAX_BYTES = int(float(os.environ.get('MANUS_PROFILE_MAX_MB', '2048')) * 1024 * 1024)
+# How long a worker waits for a profile another worker is using
+DEFAULT_LOCK_TIMEOUT = float(os.environ.get('MANUS_PROFILE_LOCK_TIMEOUT', '5'))
+
+LAST_USED_MARKER = '.last_used'
+# Left behind by a Chrome that did not exit cleanly; they block the next launch
+CHROME_SINGLETON_FILES = ('SingletonLock', 'SingletonSocket', 'SingletonCookie')
+
+
+def profile_key(email):
+    """Directory name for an account; hashed so it is filesystem safe"""
+    return hashlib.sha1(email.strip().lower().encode()).hexdigest()[:20]
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ProfileLease:
+    """Exclusive use of one profile directory until release()"""
+
+    def __init__(self, cache, key, path, lock_fd, warm):
+        self.cache = cache
+        self.key = key
+        self.path = path
+        self.warm = warm  # the profile existed already (cookies, storage may be in it)
+        self._lock_fd = lock_fd
+
+    def release(self, keep=True):
+        """Unlock the profile; keep=False deletes it (e.g. after a failed login)"""
+        self.cache._release(self, keep)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release(keep=exc_type is None)
+
+
+class ProfileCache:
+    """
+    On-disk Chrome profiles, one per account, so localStorage, IndexedDB
+    and cookies survive between syncs. A profile is used by one worker at
+    a time (flock, so this also holds across processes) and the least
+    recently used ones are evicted to stay under the count and size caps.
+    """
+
+    def __init__(self, root=None, max_profiles=None, max_bytes=None, lock_timeout=None):
+        self.root = root or DEFAULT_PROFILE_DIR
+        self.max_profiles = DEFAULT_MAX_PROFILES if max_profiles is None else max_profiles
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.lock_timeout = DEFAULT_LOCK_TIMEOUT if lock_timeout is None else lock_timeout
+        self._held = set()  # keys leased by this process
+        self._sizes = {}  # key -> bytes, measured when a lease ends
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _profile_path(self, key):
+        return os.path.join(self.root, key)
+
+    def _lock_path(self, key):
+        return os.path.join(self.root, key + '.lock')
+
+    def _try_lock(self, key):
+        """Lock file descriptor for key, or None if someone else holds it"""
+        with self._lock:
+            if key in self._held:
+                return None
+            self._held.add(key)
+
+        if fcntl is None:
+            return -1
+        fd = os.open(self._lock_path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            with self._lock:
+                self._held.discard(key)
+            return None
+        return fd
+
+    def _unlock(self, key, fd):
+        if fd is not None and fd >= 0:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        with self._lock:
+            self._held.discard(key)
+
+    def acquire(self, email, timeout=None):
+        """Lease the profile for email, or None if it stays busy past timeout"""
+        key = profile_key(email)
+        deadline = time.monotonic() + (self.lock_timeout if timeout is None else timeout)
+        while True:
+            fd = self._try_lock(key)
+            if fd is not None:
+                break
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.1)
+
+        path = self._profile_path(key)
+        warm = os.path.isdir(path)
+        os.makedirs(path, exist_ok=True)
+        # We hold the lock, so no Chrome is using this profile right now
+        for name in CHROME_SINGLETON_FILES:
+            try:
+                os.unlink(os.path.join(path, name))
+            except OSError:
+                pass
+        return ProfileLease(self, key, path, fd, warm)
+
+    def _release(self, lease, keep):
+        try:
+            if keep:
+                with open(os.path.join(lease.path, LAST_USED_MARKER), 'w') as f:
+                    f.write(str(time.time()))
+                size = _dir_size(lease.path)
+                with self._lock:
+                    self._sizes[lease.key] = size
+            else:
+                shutil.rmtree(lease.path, ignore_errors=True)
+                with self._lock:
+                    self._sizes.pop(lease.key, None)
+        finally:
+            self._unlock(lease.key, lease._lock_fd)
+        self.evict()
+
+    def _profiles(self):
+        """(last used, key) for every profile on disk"""
+        profiles = []
+        for name in os.listdir(self.root):
+            path = self._profile_path(name)
+            if not os.path.isdir(path):
+                continue
+            try:
+                last_used = os.path.getmtime(os.path.join(path, LAST_USED_MARKER))
+            except OSError:
+                last_used = os.path.getmtime(path)
+            profiles.append((last_used, name))
+        return sorted(profiles)
+
+    def _size(self, key):
+        with self._lock:
+            size = self._sizes.get(key)
+        if size is None:
+            size = _dir_size(self._profile_path(key))
+            with self._lock:
+                self._sizes[key] = size
+        return size
+
+    def evict(self):
+        """Delete least recently used, unlocked profiles until both caps are met"""
+        profiles = self._profiles()
+        count = len(profiles)
+        total = sum(self._size(key) for _, key in profiles)
+        evicted = 0
+        for _, key in profiles:
+            if count <= self.max_profiles and total <= self.max_bytes:
+                break
+            fd = self._try_lock(key)
+            if fd is None:
+                continue
+            try:
+                size = self._size(key)
+                shutil.rmtree(self._profile_path(key), ignore_errors=True)
+                with self._lock:
+                    self._sizes.pop(key, None)
+            finally:
+                # The lock file stays: deleting it could let two processes lock different inodes
+                self._unlock(key, fd)
+            count -= 1
+            total -= size
+            evicted += 1
+        return evicted
+
+    def stats(self):
+        profiles = self._profiles()
+        return {
+            'profiles': len(profiles),
+            'bytes': sum(self._size(key) for _, key in profiles),
+            'max_profiles': self.max_profiles,
+            'max_bytes': self.max_bytes
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_profile_cache():
+    """Process-wide profile cache, or None unless MANUS_PROFILE_CACHE=1"""
+    global _cache
+    if not PROFILE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ProfileCache()
+        return _cache
@@ -0,0 +1,175 @@
+"""
+Request blocking for automated logins.
+
+A login only needs the document, its scripts and the XHRs they make;
+images, fonts, media and third-party trackers are pure overhead. Requests
+are intercepted with the CDP Fetch domain, but only those that match a
+blocked resource type or denied domain are paused, so everything else
+loads at full speed. Allow-listed hosts are never blocked.
+
+    MANUS_BLOCK_RESOURCES=0           turn blocking off
+    MANUS_BLOCK_TYPES=image,font      CDP resource types to block
+    MANUS_BLOCK_DOMAINS=a.com,b.net   hosts (and subdomains) to block entirely
+    MANUS_ALLOW_DOMAINS=cdn.manus.im  hosts that are never blocked
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+from src.services import metrics
+
+BLOCKING_ENABLED = os.environ.get('MANUS_BLOCK_RESOURCES', '1') != '0'
+DEFAULT_BLOCK_TYPES = 'image,media,font'
+DEFAULT_BLOCK_DOMAINS = ','.join([
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'facebook.net', 'connect.facebook.net', 'hotjar.com', 'segment.io', 'segment.com',
+    'mixpanel.com', 'amplitude.com', 'clarity.ms', 'intercom.io', 'intercomcdn.com'
+])
+
+# performance API summary of the current document and everything it loaded
+PAGE_WEIGHT_JS = """
+const resources = performance.getEntriesByType('resource');
+const nav = performance.getEntriesByType('navigation')[0] || {};
+return {
+  resources: resources.length,
+  transfer_bytes: resources.reduce((sum, e) => sum + (e.transferSize || 0), 0) + (nav.transferSize || 0),
+  dom_content_loaded_ms: nav.domContentLoadedEventEnd || 0,
+  load_ms: nav.loadEventEnd || nav.duration || 0
+};
+"""
+
+
+def _split(value):
+    return [item.strip().lower() for item in (value or '').split(',') if item.strip()]
+
+
+def _host_matches(host, domains):
+    return any(host == domain or host.endswith('.' + domain) for domain in domains)
+
+
+class BlockPolicy:
+    """Which requests to block: allow list first, then denied hosts, then resource types"""
+
+    def __init__(self, block_types=(), deny_domains=(), allow_domains=(), enabled=True):
+        self.block_types = {item.lower() for item in block_types}
+        self.deny_domains = [domain.lstrip('.').lower() for domain in deny_domains]
+        self.allow_domains = [domain.lstrip('.').lower() for domain in allow_domains]
+        self.enabled = enabled and bool(self.block_types or self.deny_domains)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            block_types=_split(os.environ.get('MANUS_BLOCK_TYPES', DEFAULT_BLOCK_TYPES)),
+            deny_domains=_split(os.environ.get('MANUS_BLOCK_DOMAINS', DEFAULT_BLOCK_DOMAINS)),
+            allow_domains=_split(os.environ.get('MANUS_ALLOW_DOMAINS', '')),
+            enabled=BLOCKING_ENABLED
+        )
+
+    def should_block(self, url, resource_type=None):
+        if not self.enabled:
+            return False
+        host = (urlsplit(url).hostname or '').lower()
+        if _host_matches(host, self.allow_domains):
+            return False
+        if _host_matches(host, self.deny_domains):
+            return True
+        return (resource_type or '').lower() in self.block_types
+
+    def fetch_patterns(self, devtools):
+        """Fetch.enable patterns: only requests that might be blocked get paused"""
+        fetch, network = devtools.fetch, devtools.network
+        patterns = []
+        for resource_type in network.ResourceType:
+            if resource_type.value.lower() in self.block_types:
+                patterns.append(fetch.RequestPattern(url_pattern='*', resource_type=resource_type))
+        for domain in self.deny_domains:
+            patterns.append(fetch.RequestPattern(url_pattern=f'*://{domain}/*'))
+            patterns.append(fetch.RequestPattern(url_pattern=f'*://*.{domain}/*'))
+        return patterns
+
+    def decide(self, devtools, event):
+        """Fetch command answering a Fetch.requestPaused event"""
+        fetch = devtools.fetch
+        resource_type = event.resource_type.value if event.resource_type else None
+        if self.should_block(event.request.url, resource_type):
+            metrics.blocked_requests.inc(type=(resource_type or 'other').lower())
+            return fetch.fail_request(event.request_id, devtools.network.ErrorReason.BLOCKED_BY_CLIENT)
+        return fetch.continue_request(event.request_id)
+
+
+class RequestBlocker:
+    """Applies a BlockPolicy to one Selenium Chrome driver"""
+
+    def __init__(self, driver, policy):
+        self.driver = driver
+        self.policy = policy
+        self._devtools = None
+        self._connection = None
+        # WebSocketConnection.execute() allocates command ids and collects replies
+        # without a lock, and every paused request arrives on its own thread
+        self._execute_lock = threading.Lock()
+
+    def install(self):
+        """Start intercepting; returns False (and blocks nothing) if CDP is unavailable"""
+        if not self.policy.enabled:
+            return False
+        try:
+            # Selenium's CDP connection delivers events on its own threads
+            self._devtools, self._connection = self.driver.start_devtools()
+            self._connection.add_callback(self._devtools.fetch.RequestPaused, self._on_paused)
+            self._execute(self._devtools.fetch.enable(patterns=self.policy.fetch_patterns(self._devtools)))
+            return True
+        except Exception as e:
+            print(f"Request blocking unavailable: {e}")
+            return False
+
+    def _execute(self, command):
+        with self._execute_lock:
+            return self._connection.execute(command)
+
+    def _on_paused(self, event):
+        try:
+            self._execute(self.policy.decide(self._devtools, event))
+        except Exception as e:
+            # The request stays paused otherwise; let it through
+            print(f"Request interception failed: {e}")
+            try:
+                self._execute(self._devtools.fetch.continue_request(event.request_id))
+            except Exception:
+                pass
+
+
+def page_weight(driver):
+    """Resources, transfer bytes and load timings of the current page, or None"""
+    try:
+        weight = driver.execute_script(PAGE_WEIGHT_JS)
+    except Exception:
+        return None
+    return weight if isinstance(weight, dict) else None
+
+
+def observe_page_weight(weight, page):
+    """Feed a page_weight() result into the page metrics"""
+    if not isinstance(weight, dict):
+        return None
+    blocking = 'on' if get_block_policy().enabled else 'off'
+    metrics.page_transfer_bytes.observe(weight['transfer_bytes'], page=page, blocking=blocking)
+    metrics.page_load_seconds.observe(weight['load_ms'] / 1000, page=page, blocking=blocking)
+    return weight
+
+
+def record_page_weight(driver, page):
+    """Measure the current page of a Selenium driver into the page metrics"""
+    return observe_page_weight(page_weight(driver), page)
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_block_policy():
+    """Process-wide policy read from the environment"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = BlockPolicy.from_env()
+        return _policy
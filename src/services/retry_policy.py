@@ -0,0 +1,64 @@
+"""
+Retry schedule for failed account syncs.
+
+Every failed sync is recorded on the account's SyncRetry row. Transient
+failures (timeouts, error pages, browser trouble on our side) are retried
+after a jittered exponential backoff until SYNC_RETRY_MAX_ATTEMPTS is
+reached; permanent ones (bad credentials) are parked right away so they
+are not hammered until someone syncs the account by hand. A successful
+sync deletes the row.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+from src.models.retry import SyncRetry
+from src.services import sync_control
+from src.services.sync_engine import classify_result
+
+# Delay before retry n is drawn from [d/2, d] with d = BASE * 2^(n - 1), capped at MAX
+RETRY_BASE = float(os.environ.get('SYNC_RETRY_BASE_MINUTES', '15')) * 60
+RETRY_MAX = float(os.environ.get('SYNC_RETRY_MAX_HOURS', '6')) * 3600
+# Consecutive transient failures after which an account is parked
+MAX_ATTEMPTS = int(os.environ.get('SYNC_RETRY_MAX_ATTEMPTS', '8'))
+
+TRANSIENT_KINDS = (sync_control.UPSTREAM, sync_control.LOCAL)
+
+
+def backoff_delay(attempts, base=None, cap=None, rng=random):
+    """Seconds to wait after the given number of consecutive failures"""
+    base = RETRY_BASE if base is None else base
+    cap = RETRY_MAX if cap is None else cap
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    # Equal jitter: spreads out accounts that failed together, yet keeps growing
+    return delay / 2 + rng.uniform(0, delay / 2)
+
+
+def record_failure(account, kind, message, now=None):
+    """Count a failed sync on account.retry_record and schedule the next try (caller commits)"""
+    now = now or datetime.utcnow()
+    retry = account.retry_record
+    if retry is None:
+        retry = account.retry_record = SyncRetry(attempts=0, first_failed_at=now)
+    retry.attempts = (retry.attempts or 0) + 1
+    retry.error_kind = kind
+    retry.last_error = message
+    retry.updated_at = now
+
+    if kind in TRANSIENT_KINDS and retry.attempts < MAX_ATTEMPTS:
+        retry.next_attempt_at = now + timedelta(seconds=backoff_delay(retry.attempts))
+    else:
+        retry.next_attempt_at = None
+        reason = 'permanent error' if kind not in TRANSIENT_KINDS else f'{retry.attempts} attempts'
+        print(f"Not retrying {account.email} ({reason}): {message}")
+    return retry
+
+
+def record_retry(account, result, now=None):
+    """Update the retry state of account from a SyncResult (caller commits)"""
+    if result.skipped:
+        # Never attempted; the circuit breaker decides when it runs again
+        return None
+    if result.success:
+        account.retry_record = None
+        return None
+    return record_failure(account, classify_result(result), result.message, now)
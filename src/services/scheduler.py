@@ -1,77 +1,358 @@
-import schedule
+import os
 import time
+import heapq
 import threading
 from datetime import datetime
+from sqlalchemy.orm import selectinload
 from src.models.account import ManusAccount, db
-from src.services.manus_service import ManusService
+from src.models.session import ManusSession
+from src.models.retry import SyncRetry
+from src.models.sync_run import SyncRun, SyncRunItem, ITEM_PENDING
+from src.services.sync_engine import SyncEngine, SyncJob, SyncResult, apply_result
+from src.services.metrics import phase
+from src.services.sync_control import get_circuit_breaker
+from src.services.retry_policy import record_failure, record_retry
+from src.services import sync_control
+from src.services import sync_runs
+from src.services.account_leases import get_account_leases
+from src.services.sync_history import HistoryWorker, record_event
+
+# Refresh a session this long after its last login when no cookie expiry is known
+REFRESH_INTERVAL = float(os.environ.get('SYNC_REFRESH_INTERVAL_HOURS', '24')) * 3600
+# Refresh this long before the earliest stored cookie expires
+EXPIRY_MARGIN = float(os.environ.get('SYNC_EXPIRY_MARGIN_HOURS', '6')) * 3600
+# Never re-sync a healthy account sooner than this after its last login, even when
+# the stored cookies are already inside EXPIRY_MARGIN (a verified sync keeps them)
+MIN_RECHECK_INTERVAL = float(os.environ.get('SYNC_MIN_RECHECK_MINUTES', '60')) * 60
+# Reload due times from the database at least this often (new/edited accounts)
+RESCAN_INTERVAL = float(os.environ.get('SYNC_RESCAN_MINUTES', '15')) * 60
+# Accounts loaded, synced and committed together
+CHUNK_SIZE = int(os.environ.get('SYNC_CHUNK_SIZE', '50'))
+# 'threads': one pooled Chrome per concurrent account,
+# 'contexts': isolated browser contexts inside a single Chrome (see context_sync)
+SYNC_MODE = os.environ.get('SYNC_MODE', 'threads')
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _timestamp(value):
+    return (value - EPOCH).total_seconds() if value else None
+
+
+def next_due(status, last_login, earliest_expiry, failed=False, retry_at=None, now=None):
+    """When an account should next be synced (epoch seconds), None if it is parked"""
+    now = time.time() if now is None else now
+    
+    if failed:
+        # Failed accounts follow their retry schedule (see retry_policy)
+        return _timestamp(retry_at)
+    
+    last_login = _timestamp(last_login)
+    if status != 'active' or last_login is None:
+        return now
+    
+    if earliest_expiry is not None:
+        return max(_timestamp(earliest_expiry) - EXPIRY_MARGIN, last_login + MIN_RECHECK_INTERVAL)
+    return last_login + REFRESH_INTERVAL
+
+
+def account_next_due(account, now=None):
+    record = account.session_record
+    retry = account.retry_record
+    return next_due(account.status, account.last_login,
+                    record.earliest_expiry if record else None,
+                    retry is not None, retry.next_attempt_at if retry else None, now)
+
 
 class AccountScheduler:
-    def __init__(self, app):
+    def __init__(self, app, max_workers=None, account_timeout=None):
         self.app = app
+        if SYNC_MODE == 'contexts':
+            from src.services.context_sync import ContextSyncEngine
+            self.engine = ContextSyncEngine(max_workers=max_workers, account_timeout=account_timeout)
+        else:
+            self.engine = SyncEngine(max_workers=max_workers, account_timeout=account_timeout)
         self.running = False
         self.scheduler_thread = None
+        # Other instances may sync the same database; accounts are leased before syncing
+        self.leases = get_account_leases(app)
+        self.history = HistoryWorker(app)
+        
+        self._heap = []  # (due, account_id); stale entries are skipped on pop
+        self._due = {}  # account_id -> due
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._last_scan = 0
     
-    def sync_all_accounts(self):
-        """Sync all accounts - called by scheduler"""
-        with self.app.app_context():
-            print(f"[{datetime.now()}] Starting scheduled account sync...")
-            
-            accounts = ManusAccount.query.all()
+    def _chunk_query(self):
+        # Sessions (with their payloads) are needed for every account in a chunk
+        return ManusAccount.query.options(
+            selectinload(ManusAccount.session_record).undefer(ManusSession.payload),
+            selectinload(ManusAccount.retry_record)
+        )
+    
+    def _iter_chunks(self, run_id, recheck_due=False):
+        """
+        Yield the run's pending accounts as lists, CHUNK_SIZE at a time, ordered by id.
+        Only accounts this instance manages to lease are yielded; with
+        recheck_due, accounts that are no longer due (a peer synced them) are dropped.
+        """
+        last_id = 0
+        while True:
+            # Keyset pagination: never holds more than one chunk in the session
+            candidate_ids = [account_id for (account_id,) in db.session.query(SyncRunItem.account_id).filter(
+                SyncRunItem.run_id == run_id,
+                SyncRunItem.state == ITEM_PENDING,
+                SyncRunItem.account_id > last_id
+            ).order_by(SyncRunItem.account_id).limit(CHUNK_SIZE)]
+            if not candidate_ids:
+                return
+            last_id = candidate_ids[-1]
             
-            for account in accounts:
-                try:
-                    print(f"Syncing account: {account.email}")
-                    
-                    manus_service = ManusService()
-                    password = account.get_password()
-                    
-                    if not password:
-                        print(f"No password found for {account.email}")
-                        account.status = 'error'
-                        continue
-                    
-                    success, session_data, error_msg = manus_service.refresh_session(
-                        account.email, 
-                        password, 
-                        account.get_session_data()
-                    )
-                    
-                    if success:
-                        account.status = 'active'
-                        account.last_login = datetime.utcnow()
-                        account.set_session_data(session_data)
-                        print(f"Successfully synced {account.email}")
-                    else:
-                        account.status = 'error'
-                        print(f"Failed to sync {account.email}: {error_msg}")
-                    
-                    account.updated_at = datetime.utcnow()
-                    
-                except Exception as e:
-                    print(f"Error syncing {account.email}: {str(e)}")
-                    account.status = 'error'
-                    account.updated_at = datetime.utcnow()
+            claimed = self.leases.claim(candidate_ids)
+            busy = self.leases.leased_until(set(candidate_ids) - claimed)
+            if busy:
+                self._defer_leased(run_id, busy)
+            if claimed and recheck_due:
+                claimed = self._drop_not_due(run_id, claimed)
+            if not claimed:
+                continue
             
+            yield self._chunk_query().filter(ManusAccount.id.in_(claimed)).order_by(ManusAccount.id).all()
+    
+    def _defer_leased(self, run_id, leased_until):
+        """Leave accounts leased by a peer to it; look again once its lease could have expired"""
+        for account_id, expires in leased_until.items():
+            sync_runs.checkpoint(run_id, account_id, SyncResult(
+                account_id, None, False, message='Being synced by another instance', skipped=True))
+            self._push(account_id, (_timestamp(expires) if expires else time.time()) + 1)
+        db.session.commit()
+    
+    def _drop_not_due(self, run_id, account_ids):
+        """Release accounts that stopped being due since they were queued; returns the rest"""
+        now = time.time()
+        due_times = self._due_times(account_ids, now)
+        not_due = [account_id for account_id, due in due_times.items() if due is None or due > now]
+        if not not_due:
+            return set(account_ids)
+        for account_id in not_due:
+            sync_runs.checkpoint(run_id, account_id, SyncResult(
+                account_id, None, False, message='No longer due', skipped=True))
+            self._push(account_id, due_times[account_id])
+        self.leases.release(not_due)
+        db.session.commit()
+        return set(account_ids) - set(not_due)
+    
+    def _sync_chunk(self, accounts, run_id):
+        """Sync one chunk of accounts and commit it together with the run checkpoint"""
+        accounts_by_id = {account.id: account for account in accounts}
+        
+        # Decode credentials here so worker threads never touch the ORM
+        jobs = []
+        for account in accounts:
+            try:
+                jobs.append(SyncJob.from_account(account))
+            except Exception as e:
+                print(f"Error preparing {account.email}: {str(e)}")
+                record_failure(account, sync_control.LOCAL, f"Sync error: {str(e)}")
+                account.status = 'error'
+                account.updated_at = datetime.utcnow()
+                result = SyncResult(account.id, account.email, False, message=f"Sync error: {str(e)}")
+                sync_runs.checkpoint(run_id, account.id, result)
+                record_event(result)
+        
+        skipped = set()
+        
+        def on_result(result):
+            account = accounts_by_id[result.account_id]
+            sync_runs.checkpoint(run_id, account.id, result)
+            record_event(result)
+            if result.skipped:
+                # Upstream is unhealthy; not this account's fault
+                skipped.add(account.id)
+                return
+            apply_result(account, result)
+            record_retry(account, result)
+            # The row owns the session now; don't keep a second copy per result
+            result.session_data = None
+            if result.success:
+                print(f"Successfully synced {account.email}")
+            else:
+                print(f"Failed to sync {account.email}: {result.message}")
+        
+        results = self.engine.run(jobs, on_result=on_result, on_abandoned_done=self._release_abandoned)
+        # A timed-out account may still be driven by its abandoned worker; it stays
+        # leased (and renewed) until that worker returns
+        abandoned = {result.account_id for result in results if result.abandoned}
+        
+        # Work out due times before commit expires the instances
+        breaker = self.engine.breaker or get_circuit_breaker()
+        retry_at = breaker.retry_at or time.time()
+        for account in accounts:
+            if account.id in skipped:
+                self._push(account.id, max(retry_at, time.time()))
+            else:
+                self._push(account.id, account_next_due(account))
+        
+        sync_runs.heartbeat(run_id)
+        # Leases end in the same commit as the results they protected
+        finished = [account_id for account_id in accounts_by_id if account_id not in abandoned]
+        self.leases.release(finished)
+        try:
+            with phase('db_commit'):
+                db.session.commit()
+        except Exception as e:
+            print(f"Error committing changes: {str(e)}")
+            db.session.rollback()
+            self._release_after_rollback(finished)
+        
+        # Release ORM state so memory stays flat over long runs
+        db.session.expunge_all()
+        return results
+    
+    def _release_abandoned(self, account_id):
+        """Release the lease of a timed-out account once its worker has returned"""
+        with self.app.app_context():
             try:
+                self.leases.release([account_id])
                 db.session.commit()
-                print(f"[{datetime.now()}] Scheduled sync completed for {len(accounts)} accounts")
             except Exception as e:
-                print(f"Error committing changes: {str(e)}")
                 db.session.rollback()
+                print(f"Error releasing lease on account {account_id}: {str(e)}")
+    
+    def _release_after_rollback(self, account_ids):
+        try:
+            self.leases.release(account_ids)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error releasing account leases: {str(e)}")
+    
+    def sync_accounts(self, account_ids=None, source='scheduled', run_id=None):
+        """
+        Sync the given accounts (all when None) and return their results.
+        The sync is recorded as a SyncRun (or continues run_id); accounts are
+        streamed in chunks and each chunk is committed with its checkpoint
+        as soon as it finishes, so an interrupted run can be resumed.
+        """
+        with self.app.app_context():
+            if run_id is None:
+                run_id = sync_runs.start_run(source, account_ids).id
+            else:
+                source = db.session.get(SyncRun, run_id).source
+            results = []
+            print(f"Syncing accounts of run {run_id} in chunks of {CHUNK_SIZE} "
+                  f"with up to {self.engine.max_workers} workers")
+            # Due-driven runs skip accounts a peer instance has synced in the meantime
+            for accounts in self._iter_chunks(run_id, recheck_due=source == 'scheduled'):
+                results.extend(self._sync_chunk(accounts, run_id))
+                print(f"[{datetime.now()}] Committed chunk, {len(results)} accounts synced so far")
+            
+            sync_runs.finish_run(run_id)
+            print(f"[{datetime.now()}] Sync completed for {len(results)} accounts")
+            return results
+    
+    def sync_all_accounts(self, source='full'):
+        """Sync all accounts regardless of when they are due"""
+        print(f"[{datetime.now()}] Starting full account sync...")
+        return self.sync_accounts(source=source)
+    
+    def resume_interrupted_runs(self):
+        """Finish runs whose process went away, syncing only their pending accounts"""
+        with self.app.app_context():
+            run_ids = sync_runs.claim_interrupted_runs()
+        for run_id in run_ids:
+            print(f"[{datetime.now()}] Resuming interrupted sync run {run_id}")
+            self.sync_accounts(run_id=run_id)
+        return run_ids
+    
+    def _push(self, account_id, due):
+        with self._lock:
+            if due is None:
+                # Parked: only a manual sync picks it up again
+                self._due.pop(account_id, None)
+                return
+            self._due[account_id] = due
+            heapq.heappush(self._heap, (due, account_id))
+    
+    def _due_times(self, account_ids=None, now=None):
+        """{account_id: next due} from the database, for the given accounts or all"""
+        # Summary columns only; cookie payloads are never loaded here
+        query = db.session.query(
+            ManusAccount.id, ManusAccount.status, ManusAccount.last_login, ManusSession.earliest_expiry,
+            SyncRetry.id, SyncRetry.next_attempt_at
+        ).outerjoin(ManusSession, ManusSession.account_id == ManusAccount.id) \
+            .outerjoin(SyncRetry, SyncRetry.account_id == ManusAccount.id)
+        if account_ids is not None:
+            query = query.filter(ManusAccount.id.in_(list(account_ids)))
+        now = time.time() if now is None else now
+        return {account_id: next_due(status, last_login, expiry, retry_id is not None, retry_at, now)
+                for account_id, status, last_login, expiry, retry_id, retry_at in query.all()}
+    
+    def rescan(self):
+        """Rebuild the due-time heap from the database"""
+        with self.app.app_context():
+            entries = [(due, account_id) for account_id, due in self._due_times().items() if due is not None]
+            db.session.rollback()
+        
+        heapq.heapify(entries)
+        with self._lock:
+            self._heap = entries
+            self._due = {account_id: due for due, account_id in entries}
+        self._last_scan = time.time()
+    
+    def pop_due(self, now=None):
+        """Remove and return the ids of every account that is due"""
+        now = time.time() if now is None else now
+        due_ids = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, account_id = heapq.heappop(self._heap)
+                if self._due.get(account_id) != due:
+                    continue
+                del self._due[account_id]
+                due_ids.append(account_id)
+        return due_ids
+    
+    def seconds_until_next(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - now)
+    
+    def wake(self):
+        """Rescan immediately, e.g. after accounts were added or edited"""
+        self._last_scan = 0
+        self._wakeup.set()
     
     def run_scheduler(self):
         """Run the scheduler in a separate thread"""
         print("Account scheduler started")
         
-        # Schedule daily sync at midnight
-        schedule.every().day.at("00:00").do(self.sync_all_accounts)
-        
-        # For testing purposes, also schedule every 5 minutes (comment out in production)
-        # schedule.every(5).minutes.do(self.sync_all_accounts)
-        
         while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            try:
+                if time.time() - self._last_scan >= RESCAN_INTERVAL:
+                    # Also runs on start, picking up runs cut short by a restart
+                    self.resume_interrupted_runs()
+                    self.rescan()
+                
+                due_ids = self.pop_due()
+                if due_ids:
+                    print(f"[{datetime.now()}] {len(due_ids)} accounts due for sync")
+                    self.sync_accounts(due_ids)
+                    continue
+            except Exception as e:
+                print(f"Scheduler error: {str(e)}")
+            
+            # Sleep exactly until the next account is due (or the next rescan)
+            until_rescan = max(0.0, RESCAN_INTERVAL - (time.time() - self._last_scan))
+            until_due = self.seconds_until_next()
+            timeout = until_rescan if until_due is None else min(until_due, until_rescan)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
         
         print("Account scheduler stopped")
     
@@ -82,19 +363,24 @@ class AccountScheduler:
             self.scheduler_thread = threading.Thread(target=self.run_scheduler)
             self.scheduler_thread.daemon = True
             self.scheduler_thread.start()
+            self.history.start()
             print("Scheduler started successfully")
     
     def stop(self):
         """Stop the scheduler"""
         self.running = False
+        self._wakeup.set()
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        if hasattr(self.engine, 'close'):
+            self.engine.close()
+        self.leases.stop()
+        self.history.stop()
         print("Scheduler stopped")
     
     def trigger_manual_sync(self):
         """Trigger a manual sync immediately"""
-        thread = threading.Thread(target=self.sync_all_accounts)
+        thread = threading.Thread(target=self.sync_all_accounts, args=('manual',))
         thread.daemon = True
         thread.start()
         return "Manual sync triggered"
-
@@ -0,0 +1,125 @@
+import os
+import re
+import time
+import threading
+from urllib.parse import urlsplit
+import urllib3
+
+# Defaults to the site root the browser uses (MANUS_BASE_URL)
+DEFAULT_BASE_URL = os.environ.get('MANUS_VERIFY_URL') or os.environ.get('MANUS_BASE_URL', 'https://manus.chat')
+DEFAULT_TIMEOUT = float(os.environ.get('MANUS_HTTP_VERIFY_TIMEOUT', '5'))
+DEFAULT_MAX_CONNECTIONS = int(os.environ.get('MANUS_HTTP_VERIFY_CONNECTIONS', '8'))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# Markers in the response body that settle the question without a browser
+LOGGED_IN_PATTERN = re.compile(r'class="[^"]*(?:dashboard|profile|user-menu)[^"]*"', re.IGNORECASE)
+LOGIN_FORM_PATTERN = re.compile(r'<input[^>]+type=["\']password["\']', re.IGNORECASE)
+
+
+def _domain_matches(host, cookie_domain):
+    if not cookie_domain:
+        return True
+    cookie_domain = cookie_domain.lstrip('.').lower()
+    return host == cookie_domain or host.endswith('.' + cookie_domain)
+
+
+def build_cookie_header(cookies, url, now=None):
+    """Cookie header for url from Selenium-style cookie dicts, skipping expired ones"""
+    now = time.time() if now is None else now
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    path = parts.path or '/'
+    secure = parts.scheme == 'https'
+
+    pairs = []
+    for cookie in cookies or []:
+        if 'name' not in cookie or 'value' not in cookie:
+            continue
+        expiry = cookie.get('expiry')
+        if expiry is not None and expiry <= now:
+            continue
+        if cookie.get('secure') and not secure:
+            continue
+        if not _domain_matches(host, cookie.get('domain')):
+            continue
+        if not path.startswith(cookie.get('path') or '/'):
+            continue
+        pairs.append(f"{cookie['name']}={cookie['value']}")
+    return '; '.join(pairs)
+
+
+class HttpSessionVerifier:
+    """
+    Checks stored cookies with a plain HTTP request instead of a browser.
+    verify() returns (True, msg) / (False, msg) when the answer is clear and
+    (None, msg) when the caller should fall back to the Selenium check.
+    """
+
+    def __init__(self, base_url=None, timeout=None, pool_manager=None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+        self.http = pool_manager or urllib3.PoolManager(
+            maxsize=DEFAULT_MAX_CONNECTIONS,
+            retries=False,
+            headers={'User-Agent': USER_AGENT},
+        )
+
+    def verify(self, session_data):
+        cookies = (session_data or {}).get('cookies')
+        if not cookies:
+            return False, "No session data available"
+
+        now = time.time()
+        if all(cookie.get('expiry') is not None and cookie['expiry'] <= now for cookie in cookies):
+            return False, "All session cookies have expired"
+
+        url = self.base_url + '/'
+        cookie_header = build_cookie_header(cookies, url, now)
+        if not cookie_header:
+            return None, "No cookies apply to the verification URL"
+
+        try:
+            response = self.http.request(
+                'GET', url,
+                headers={'Cookie': cookie_header, 'Accept': 'text/html,application/json'},
+                redirect=False,
+                timeout=urllib3.Timeout(total=self.timeout),
+                preload_content=False,
+            )
+        except Exception as e:
+            return None, f"HTTP verification failed: {str(e)}"
+
+        try:
+            status = response.status
+            if status in (301, 302, 303, 307, 308):
+                location = (response.headers.get('Location') or '').lower()
+                if 'login' in location or 'signin' in location:
+                    return False, "Session expired (redirected to login)"
+                return None, f"Redirected to {location or 'unknown location'}"
+            if status in (401, 403):
+                return False, f"Session rejected (HTTP {status})"
+            if status != 200:
+                return None, f"Inconclusive HTTP {status}"
+
+            # Only the start of the document is needed to spot the markers
+            body = response.read(64 * 1024, decode_content=True).decode('utf-8', errors='replace')
+            if LOGIN_FORM_PATTERN.search(body):
+                return False, "Session expired (login form served)"
+            if LOGGED_IN_PATTERN.search(body):
+                return True, "Session is valid"
+            return None, "Inconclusive response body"
+        finally:
+            response.release_conn()
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_session_verifier():
+    """Process-wide verifier sharing one connection pool"""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            _verifier = HttpSessionVerifier()
+        return _verifier
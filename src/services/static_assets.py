@@ -0,0 +1,139 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Vite emits content-hashed bundles like assets/index-BcOShUop.js: exactly 8 base64url
+# characters before the extension. A real hash has a digit or capital in it, which
+# keeps names like assets/brand-wordmark.svg from being cached for a year
+HASHED_ASSET_PATTERN = re.compile(r'(^|/)assets/.+-(?=[A-Za-z0-9_-]{0,7}[0-9A-Z])[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+MIN_COMPRESS_SIZE = 512
+# Files larger than this are streamed from disk instead of kept in memory
+MAX_MEMORY_SIZE = 8 * 1024 * 1024
+
+
+class StaticAsset:
+    def __init__(self, path, filename, mimetype, data, cache_control):
+        self.path = path
+        self.filename = filename
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.variants = {}  # encoding ('identity', 'gzip', 'br') -> bytes
+        digest = hashlib.sha256(data if data is not None else self._hash_file(filename)).hexdigest()
+        self.etag = digest[:32]
+        if data is not None:
+            self.variants['identity'] = data
+
+    @staticmethod
+    def _hash_file(filename):
+        hasher = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        return hasher.digest()
+
+    def choose_encoding(self, accept_encodings):
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+
+
+class AssetManifest:
+    """
+    In-memory index of the static folder, built once at startup.
+    Requests are answered from memory with precompressed variants and no
+    filesystem access; unknown paths fall back to index.html for the SPA.
+    """
+
+    def __init__(self, static_folder, index='index.html'):
+        self.static_folder = static_folder
+        self.index = index
+        self.assets = {}
+        if static_folder and os.path.isdir(static_folder):
+            self._build()
+
+    def _build(self):
+        for root, _, files in os.walk(self.static_folder):
+            for name in files:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                filename = os.path.join(root, name)
+                path = os.path.relpath(filename, self.static_folder).replace(os.sep, '/')
+                self.assets[path] = self._load(path, filename)
+
+    def _load(self, path, filename):
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        cache_control = IMMUTABLE_CACHE_CONTROL if HASHED_ASSET_PATTERN.search(path) \
+            else REVALIDATE_CACHE_CONTROL
+
+        if os.path.getsize(filename) > MAX_MEMORY_SIZE:
+            return StaticAsset(path, filename, mimetype, None, cache_control)
+
+        with open(filename, 'rb') as f:
+            data = f.read()
+        asset = StaticAsset(path, filename, mimetype, data, cache_control)
+
+        # Prefer variants produced by the build, compress the rest ourselves
+        for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+            if os.path.exists(filename + suffix):
+                with open(filename + suffix, 'rb') as f:
+                    asset.variants[encoding] = f.read()
+
+        if len(data) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            if 'gzip' not in asset.variants:
+                asset.variants['gzip'] = gzip.compress(data, compresslevel=9, mtime=0)
+            if 'br' not in asset.variants and brotli is not None:
+                asset.variants['br'] = brotli.compress(data)
+            # Only keep variants that actually save bytes
+            for encoding in ('gzip', 'br'):
+                if encoding in asset.variants and len(asset.variants[encoding]) >= len(data):
+                    del asset.variants[encoding]
+        return asset
+
+    def lookup(self, path):
+        """Asset for path, the SPA index for unknown paths, or None"""
+        return self.assets.get(path) or self.assets.get(self.index)
+
+    def respond(self, path, request):
+        asset = self.lookup(path)
+        if asset is None:
+            return None
+
+        if 'identity' not in asset.variants:
+            # Too large to cache; stream it from disk
+            from flask import send_file
+            response = send_file(asset.filename, mimetype=asset.mimetype, etag=asset.etag)
+            response.headers['Cache-Control'] = asset.cache_control
+            return response
+
+        encoding = asset.choose_encoding(request.accept_encodings)
+        # Each encoding is a different representation and needs its own strong ETag
+        etag = asset.etag if encoding == 'identity' else f"{asset.etag}-{encoding}"
+
+        headers = {
+            'Cache-Control': asset.cache_control,
+            'Vary': 'Accept-Encoding'
+        }
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+            response.set_etag(etag)
+            return response
+
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        return response
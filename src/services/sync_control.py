@@ -0,0 +1,189 @@
+import os
+import time
+import threading
+from src.services import metrics
+
+# Concurrency window for logins across the whole process (scheduler and queue)
+MIN_CONCURRENCY = int(os.environ.get('SYNC_CONCURRENCY_MIN', '1'))
+MAX_CONCURRENCY = int(os.environ.get('SYNC_CONCURRENCY_MAX', os.environ.get('DRIVER_POOL_MAX', '4')))
+# A sync slower than this counts as a sign of upstream pressure
+TARGET_LATENCY = float(os.environ.get('SYNC_TARGET_LATENCY', '45'))
+# Multiplicative decrease factor and the minimum gap between two decreases
+DECREASE_FACTOR = float(os.environ.get('SYNC_AIMD_DECREASE', '0.5'))
+DECREASE_COOLDOWN = float(os.environ.get('SYNC_AIMD_COOLDOWN', '10'))
+
+# Consecutive upstream failures that open the circuit
+BREAKER_THRESHOLD = int(os.environ.get('SYNC_BREAKER_THRESHOLD', '5'))
+# Pause before the first probe; doubles on every failed probe up to the max
+BREAKER_COOLDOWN = float(os.environ.get('SYNC_BREAKER_COOLDOWN', '120'))
+BREAKER_MAX_COOLDOWN = float(os.environ.get('SYNC_BREAKER_MAX_COOLDOWN', '1800'))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Outcome kinds reported back by the sync code (see sync_engine.classify_result)
+SUCCESS = 'success'
+REJECTED = 'rejected'   # bad credentials and the like; upstream is healthy
+UPSTREAM = 'upstream'   # timeouts and error pages from the site
+LOCAL = 'local'         # our side failed (no browser, crash)
+SKIPPED = 'skipped'     # never attempted because the circuit was open
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit: grows by one slot per window of healthy syncs,
+    halves on a slow sync or an upstream failure.
+    """
+
+    def __init__(self, min_limit=None, max_limit=None, initial=None, target_latency=None,
+                 decrease_factor=None, decrease_cooldown=None):
+        self.min_limit = max(1, MIN_CONCURRENCY if min_limit is None else min_limit)
+        self.max_limit = max(self.min_limit, MAX_CONCURRENCY if max_limit is None else max_limit)
+        self.target_latency = TARGET_LATENCY if target_latency is None else target_latency
+        self.decrease_factor = DECREASE_FACTOR if decrease_factor is None else decrease_factor
+        self.decrease_cooldown = DECREASE_COOLDOWN if decrease_cooldown is None else decrease_cooldown
+        self.limit = float(self.max_limit if initial is None else initial)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        metrics.sync_concurrency_limit.set(int(self.limit))
+
+    def acquire(self, timeout=None):
+        """Block until a slot is free; False if timeout passed first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency=None, kind=None):
+        """Free a slot and feed the outcome back into the limit"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if kind == UPSTREAM or (kind in (SUCCESS, REJECTED) and latency is not None
+                                    and latency > self.target_latency):
+                self._decrease()
+            elif kind in (SUCCESS, REJECTED):
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            metrics.sync_concurrency_limit.set(int(self.limit))
+            self._cond.notify_all()
+
+    def _decrease(self):
+        # One incident tends to fail every in-flight sync at once; count it once
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+    def to_dict(self):
+        with self._cond:
+            return {'limit': int(self.limit), 'in_flight': self.in_flight,
+                    'min': self.min_limit, 'max': self.max_limit}
+
+
+class CircuitBreaker:
+    """
+    Stops all logins after a burst of upstream failures.
+    While open nothing is attempted; after the cooldown a single probe is
+    let through, and its outcome closes the circuit or reopens it with a
+    longer cooldown.
+    """
+
+    def __init__(self, threshold=None, cooldown=None, max_cooldown=None):
+        self.threshold = max(1, BREAKER_THRESHOLD if threshold is None else threshold)
+        self.base_cooldown = BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.max_cooldown = BREAKER_MAX_COOLDOWN if max_cooldown is None else max_cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self.opened_at = None
+        self.retry_at = None  # epoch seconds of the next probe while open
+        self._probing = False
+        self._cond = threading.Condition()
+
+    def allow(self):
+        """True if a sync may start now; in half-open state only one probe is allowed"""
+        with self._cond:
+            if self.state == OPEN and time.time() >= self.retry_at:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, kind):
+        with self._cond:
+            if kind == UPSTREAM:
+                self.failures += 1
+                if self.state == HALF_OPEN:
+                    self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                    self._open()
+                elif self.state == CLOSED and self.failures >= self.threshold:
+                    self._open()
+            elif kind in (SUCCESS, REJECTED):
+                self.failures = 0
+                if self.state == HALF_OPEN:
+                    self.cooldown = self.base_cooldown
+                    self._set_state(CLOSED)
+                    print("Sync circuit closed; upstream is answering again")
+            if kind != SKIPPED and self.state != OPEN:
+                # A local failure neither proves nor disproves anything; probe again
+                self._probing = False
+            self._cond.notify_all()
+
+    def _open(self):
+        self.opened_at = time.time()
+        self.retry_at = self.opened_at + self.cooldown
+        self._probing = False
+        self._set_state(OPEN)
+        metrics.sync_circuit_trips.inc()
+        print(f"Sync circuit opened after {self.failures} upstream failures; "
+              f"pausing logins for {self.cooldown:.0f}s")
+
+    def _set_state(self, state):
+        self.state = state
+        metrics.sync_circuit_state.set(STATE_VALUES[state])
+
+    def wait(self, timeout):
+        """Block until the state may have changed (or timeout)"""
+        with self._cond:
+            if self.state == OPEN:
+                timeout = min(timeout, max(0.0, self.retry_at - time.time()))
+            self._cond.wait(timeout)
+
+    def to_dict(self):
+        with self._cond:
+            return {'state': self.state, 'consecutive_failures': self.failures,
+                    'cooldown': self.cooldown, 'retry_at': self.retry_at if self.state == OPEN else None}
+
+
+_limiter = None
+_breaker = None
+_control_lock = threading.Lock()
+
+
+def get_concurrency_limiter():
+    """Process-wide limiter shared by the scheduler and the sync queue"""
+    global _limiter
+    with _control_lock:
+        if _limiter is None:
+            _limiter = AdaptiveLimiter()
+        return _limiter
+
+
+def get_circuit_breaker():
+    """Process-wide circuit breaker shared by the scheduler and the sync queue"""
+    global _breaker
+    with _control_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker()
+        return _breaker
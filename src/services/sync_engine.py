@@ -0,0 +1,280 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from src.services import metrics
+from src.services import sync_control
+from src.services.sync_control import get_concurrency_limiter, get_circuit_breaker
+
+# Maximum number of accounts synced at the same time
+DEFAULT_MAX_WORKERS = int(os.environ.get('SYNC_MAX_WORKERS', '4'))
+# Seconds a single account may take before it is reported as timed out
+DEFAULT_ACCOUNT_TIMEOUT = float(os.environ.get('SYNC_ACCOUNT_TIMEOUT', '180'))
+
+# Failure messages that mean the site answered and said no
+REJECTED_PATTERN = re.compile(
+    r'password|credential|invalid|incorrect|no account|not found|disabled|banned', re.IGNORECASE)
+# Failures on our side of the connection
+LOCAL_PREFIXES = ('Failed to setup browser driver', 'Login error:', 'Session verification error:',
+                  'Sync error:', 'Error committing changes')
+
+
+class SyncJob:
+    """Plain credentials for one account, safe to hand to a worker thread"""
+
+    def __init__(self, account_id, email, password, session_data=None):
+        self.account_id = account_id
+        self.email = email
+        self.password = password
+        self.session_data = session_data or {}
+
+    @classmethod
+    def from_account(cls, account):
+        return cls(account.id, account.email, account.get_password(), account.get_session_data())
+
+
+class SyncResult:
+    """Outcome of syncing one account"""
+
+    def __init__(self, account_id, email, success, session_data=None, message='',
+                 duration=0.0, timed_out=False, path=None, skipped=False, abandoned=False):
+        self.account_id = account_id
+        self.email = email
+        self.success = success
+        self.session_data = session_data
+        self.message = message
+        self.duration = duration
+        self.timed_out = timed_out
+        self.path = path  # 'verified' (stored session still valid) or 'relogin'
+        self.skipped = skipped  # not attempted; the account keeps its current state
+        self.abandoned = abandoned  # timed out while its worker thread kept running
+
+    def __repr__(self):
+        return f'<SyncResult {self.email} success={self.success}>'
+
+
+class SyncTicket:
+    """Decides whether a job's worker or the engine's timeout reports its outcome"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.owner = None  # 'worker' or 'timeout'
+
+    def take(self, owner):
+        """Claim the report for owner; False if the other side already has it"""
+        with self._lock:
+            if self.owner is None:
+                self.owner = owner
+            return self.owner == owner
+
+    @property
+    def abandoned(self):
+        return self.owner == 'timeout'
+
+
+def sync_job(job, service_factory=None, ticket=None):
+    """Run refresh_session for a single job (executed on a worker thread)"""
+    started = time.monotonic()
+
+    if not job.password:
+        return SyncResult(job.account_id, job.email, False, message='No password found')
+
+    if service_factory is None:
+        from src.services.manus_service import ManusService
+        service_factory = ManusService
+
+    metrics.bind(account_id=job.account_id, email=job.email)
+    manus_service = None
+    try:
+        try:
+            manus_service = service_factory()
+            success, session_data, error_msg = manus_service.refresh_session(
+                job.email,
+                job.password,
+                job.session_data
+            )
+        except Exception as e:
+            success, session_data, error_msg = False, None, f"Sync error: {str(e)}"
+
+        result = SyncResult(job.account_id, job.email, success, session_data, error_msg,
+                            duration=time.monotonic() - started,
+                            path=getattr(manus_service, 'last_path', None))
+        # A job the engine already reported as timed out is not counted twice
+        if ticket is None or ticket.take('worker'):
+            record_result(result)
+        return result
+    finally:
+        metrics.unbind()
+
+
+def result_outcome(result):
+    """'success', 'failure', 'timeout' or 'skipped'"""
+    if result.skipped:
+        return 'skipped'
+    return 'success' if result.success else ('timeout' if result.timed_out else 'failure')
+
+
+def record_result(result):
+    """Count a finished sync in the metrics registry and log it as JSON"""
+    outcome = result_outcome(result)
+    path = result.path or 'unknown'
+    metrics.sync_total.inc(outcome=outcome, path=path)
+    metrics.sync_account_seconds.observe(result.duration, outcome=outcome, path=path)
+    metrics.log_event('sync_result', account_id=result.account_id, email=result.email,
+                      outcome=outcome, path=path, seconds=round(result.duration, 3),
+                      message=result.message)
+
+
+def classify_result(result):
+    """Outcome kind of a result, as understood by sync_control"""
+    if result.skipped:
+        return sync_control.SKIPPED
+    if result.success:
+        return sync_control.SUCCESS
+    message = result.message or ''
+    if result.timed_out or 'timeout' in message.lower():
+        return sync_control.UPSTREAM
+    if message.startswith(LOCAL_PREFIXES):
+        return sync_control.LOCAL
+    if message == 'No password found' or REJECTED_PATTERN.search(message):
+        return sync_control.REJECTED
+    # Any other error page (rate limiting, maintenance, unknown error)
+    return sync_control.UPSTREAM
+
+
+def controlled_sync_job(job, service_factory=None, limiter=None, breaker=None,
+                        on_start=None, wait=None, ticket=None):
+    """
+    sync_job behind the adaptive concurrency limit and the circuit breaker.
+    While the circuit is open the job is skipped, or, if wait is given,
+    wait() is called until the circuit lets it through or wait() returns False.
+    """
+    limiter = limiter or get_concurrency_limiter()
+    breaker = breaker or get_circuit_breaker()
+
+    limiter.acquire()
+    kind, latency = None, None
+    abandoned = False
+    try:
+        while not breaker.allow():
+            if wait is None or not wait():
+                result = SyncResult(job.account_id, job.email, False, skipped=True,
+                                    message="Skipped: upstream circuit open, logins paused")
+                record_result(result)
+                return result
+
+        if on_start:
+            on_start()
+        result = sync_job(job, service_factory, ticket)
+        abandoned = ticket is not None and ticket.abandoned
+        if not abandoned:
+            kind, latency = classify_result(result), result.duration
+            breaker.record(kind)
+        return result
+    finally:
+        # An abandoned job's timeout was fed to the limiter (and breaker) when the engine gave up
+        if not abandoned:
+            limiter.release(latency, kind)
+
+
+def apply_result(account, result):
+    """Copy a SyncResult onto its ManusAccount row (caller commits)"""
+    if result.skipped:
+        return
+    if result.success:
+        account.status = 'active'
+        account.last_login = datetime.utcnow()
+        account.set_session_data(result.session_data)
+    else:
+        account.status = 'error'
+    account.updated_at = datetime.utcnow()
+
+
+class SyncEngine:
+    """Runs account syncs on a bounded thread pool and collects the results"""
+
+    def __init__(self, max_workers=None, account_timeout=None, service_factory=None,
+                 limiter=None, breaker=None):
+        self.max_workers = max(1, max_workers or DEFAULT_MAX_WORKERS)
+        self.account_timeout = account_timeout or DEFAULT_ACCOUNT_TIMEOUT
+        self.service_factory = service_factory
+        # Shared with the sync queue unless given; they bound the total load on the site
+        self.limiter = limiter
+        self.breaker = breaker
+
+    def run(self, jobs, on_result=None, on_abandoned_done=None):
+        """
+        Sync all jobs concurrently and return their results.
+        Results are gathered on the calling thread; on_result is also called
+        there for every finished job, so it may touch the database session.
+        on_abandoned_done(account_id) is called from the worker thread once a
+        job reported as timed out finally returns.
+        """
+        jobs = list(jobs)
+        results = []
+        if not jobs:
+            return results
+
+        started_at = {}
+        tickets = {job.account_id: SyncTicket() for job in jobs}
+        lock = threading.Lock()
+
+        def run_job(job):
+            def mark_started():
+                # The timeout clock starts once the limiter lets the job run
+                with lock:
+                    started_at[job.account_id] = time.monotonic()
+            return controlled_sync_job(job, self.service_factory, self.limiter, self.breaker,
+                                       on_start=mark_started, ticket=tickets[job.account_id])
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs)),
+                                      thread_name_prefix='account-sync')
+        pending = {executor.submit(run_job, job): job for job in jobs}
+
+        def collect(result):
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    job = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = SyncResult(job.account_id, job.email, False,
+                                            message=f"Sync error: {str(e)}")
+                    collect(result)
+
+                now = time.monotonic()
+                for future, job in list(pending.items()):
+                    with lock:
+                        started = started_at.get(job.account_id)
+                    if started is not None and now - started > self.account_timeout:
+                        if not tickets[job.account_id].take('timeout'):
+                            # It finished just now; collected on the next pass
+                            continue
+                        # The worker thread cannot be killed; abandon it and
+                        # let the browser be cleaned up when it returns.
+                        pending.pop(future)
+                        future.cancel()
+                        result = SyncResult(job.account_id, job.email, False,
+                                            message=f"Sync timeout after {self.account_timeout:.0f}s",
+                                            duration=now - started, timed_out=True, abandoned=True)
+                        record_result(result)
+                        # A hung sync may never return; the breaker and limiter hear about it now
+                        (self.breaker or get_circuit_breaker()).record(sync_control.UPSTREAM)
+                        (self.limiter or get_concurrency_limiter()).release(result.duration, sync_control.UPSTREAM)
+                        if on_abandoned_done:
+                            future.add_done_callback(
+                                lambda _, account_id=job.account_id: on_abandoned_done(account_id))
+                        collect(result)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
@@ -0,0 +1,273 @@
+"""
+Sync history.
+
+Every sync attempt is appended to sync_events in the same commit as its
+result. A background worker in the scheduler process folds the events
+into hourly and daily rollups (sync_rollups) and per-account daily
+tallies (sync_account_daily), and prunes rows past their retention, so
+/api/accounts/stats never has to scan raw events.
+
+    SYNC_EVENT_RETENTION_DAYS=14     raw events
+    SYNC_ROLLUP_HOURLY_DAYS=35       hourly rollups
+    SYNC_ROLLUP_DAILY_DAYS=400       daily rollups and per-account tallies
+    SYNC_ROLLUP_MINUTES=5            how often the worker runs
+"""
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.account import ManusAccount
+from src.models.sync_event import SyncEvent, SyncRollup, SyncAccountDaily
+from src.services.sync_engine import result_outcome, classify_result
+
+# Rollups are rebuilt from raw events of the current day, so keep at least two days
+EVENT_RETENTION = timedelta(days=max(2.0, float(os.environ.get('SYNC_EVENT_RETENTION_DAYS', '14'))))
+HOURLY_RETENTION = timedelta(days=float(os.environ.get('SYNC_ROLLUP_HOURLY_DAYS', '35')))
+DAILY_RETENTION = timedelta(days=float(os.environ.get('SYNC_ROLLUP_DAILY_DAYS', '400')))
+ROLLUP_INTERVAL = float(os.environ.get('SYNC_ROLLUP_MINUTES', '5')) * 60
+# Hours before the newest rollup that are recomputed anyway, for events committed late
+ROLLUP_LAG = timedelta(hours=1)
+# Raw events deleted per statement while pruning
+PRUNE_BATCH = 5000
+
+PERIODS = ('hour', 'day')
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _day(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_event(result, now=None):
+    """Append the SyncEvent for a result (caller commits)"""
+    failed = not (result.success or result.skipped)
+    db.session.add(SyncEvent(
+        account_id=result.account_id,
+        occurred_at=now or datetime.utcnow(),
+        outcome=result_outcome(result),
+        duration=round(result.duration or 0.0, 3),
+        error_class=classify_result(result) if failed else None,
+        path=result.path,
+        message=(result.message or '')[:255] or None
+    ))
+
+
+def roll_up(now=None):
+    """
+    Rebuild the rollups that can have changed since the last pass (commits).
+    Hourly buckets from the newest one (at least ROLLUP_LAG back) are
+    recomputed from raw events, days from their hours, and per-account
+    tallies from the raw events of those days. Returns the events read.
+    """
+    now = now or datetime.utcnow()
+    latest = db.session.query(db.func.max(SyncRollup.bucket_start)) \
+        .filter(SyncRollup.period == 'hour').scalar()
+    if latest is None:
+        first = db.session.query(db.func.min(SyncEvent.occurred_at)).scalar()
+        if first is None:
+            return 0
+        start = _hour(first)
+    else:
+        start = min(latest, _hour(now) - ROLLUP_LAG)
+    day_start = _day(start)
+
+    hourly = defaultdict(lambda: [0, 0.0, 0.0])  # count, total, max duration
+    accounts = defaultdict(lambda: [0, 0, 0, 0.0])  # successes, failures, flips, total duration
+    last_ok = {}
+    events = 0
+    query = db.session.query(
+        SyncEvent.account_id, SyncEvent.occurred_at, SyncEvent.outcome, SyncEvent.duration,
+        SyncEvent.error_class, SyncEvent.path
+    ).filter(SyncEvent.occurred_at >= day_start).order_by(SyncEvent.occurred_at, SyncEvent.id)
+    for account_id, occurred_at, outcome, duration, error_class, path in query.yield_per(1000):
+        events += 1
+        duration = duration or 0.0
+        if occurred_at >= start:
+            bucket = hourly[(_hour(occurred_at), outcome, path or '', error_class or '')]
+            bucket[0] += 1
+            bucket[1] += duration
+            bucket[2] = max(bucket[2], duration)
+        if outcome == 'skipped':
+            continue
+        key = (_day(occurred_at), account_id)
+        ok = outcome == 'success'
+        tally = accounts[key]
+        tally[0 if ok else 1] += 1
+        tally[3] += duration
+        if last_ok.get(key, ok) != ok:
+            tally[2] += 1
+        last_ok[key] = ok
+
+    SyncRollup.query.filter(SyncRollup.period == 'hour', SyncRollup.bucket_start >= start) \
+        .delete(synchronize_session=False)
+    _insert_rollups('hour', hourly)
+
+    # Days are summed from their hours, which now include the fresh ones
+    daily = defaultdict(lambda: [0, 0.0, 0.0])
+    rows = db.session.query(
+        SyncRollup.bucket_start, SyncRollup.outcome, SyncRollup.path, SyncRollup.error_class,
+        SyncRollup.count, SyncRollup.total_duration, SyncRollup.max_duration
+    ).filter(SyncRollup.period == 'hour', SyncRollup.bucket_start >= day_start)
+    for bucket_start, outcome, path, error_class, count, total, maximum in rows:
+        bucket = daily[(_day(bucket_start), outcome, path, error_class)]
+        bucket[0] += count
+        bucket[1] += total
+        bucket[2] = max(bucket[2], maximum)
+    SyncRollup.query.filter(SyncRollup.period == 'day', SyncRollup.bucket_start >= day_start) \
+        .delete(synchronize_session=False)
+    _insert_rollups('day', daily)
+
+    SyncAccountDaily.query.filter(SyncAccountDaily.day >= day_start).delete(synchronize_session=False)
+    if accounts:
+        db.session.execute(insert(SyncAccountDaily), [
+            {'day': day, 'account_id': account_id, 'successes': tally[0], 'failures': tally[1],
+             'flips': tally[2], 'total_duration': round(tally[3], 3)}
+            for (day, account_id), tally in accounts.items()
+        ])
+    db.session.commit()
+    return events
+
+
+def _insert_rollups(period, buckets):
+    if not buckets:
+        return
+    db.session.execute(insert(SyncRollup), [
+        {'period': period, 'bucket_start': bucket_start, 'outcome': outcome, 'path': path,
+         'error_class': error_class, 'count': count, 'total_duration': round(total, 3),
+         'max_duration': maximum}
+        for (bucket_start, outcome, path, error_class), (count, total, maximum) in buckets.items()
+    ])
+
+
+def prune(now=None):
+    """Delete events and rollups past their retention (commits); returns raw events deleted"""
+    now = now or datetime.utcnow()
+    deleted = 0
+    while True:
+        ids = [event_id for (event_id,) in db.session.query(SyncEvent.id)
+               .filter(SyncEvent.occurred_at < now - EVENT_RETENTION).limit(PRUNE_BATCH)]
+        if not ids:
+            break
+        SyncEvent.query.filter(SyncEvent.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+    SyncRollup.query.filter(SyncRollup.period == 'hour',
+                            SyncRollup.bucket_start < now - HOURLY_RETENTION).delete(synchronize_session=False)
+    SyncRollup.query.filter(SyncRollup.period == 'day',
+                            SyncRollup.bucket_start < now - DAILY_RETENTION).delete(synchronize_session=False)
+    SyncAccountDaily.query.filter(SyncAccountDaily.day < now - DAILY_RETENTION).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _summary(count_by_outcome, total, maximum):
+    attempts = sum(count for outcome, count in count_by_outcome.items() if outcome != 'skipped')
+    return {
+        'attempts': attempts,
+        'successes': count_by_outcome.get('success', 0),
+        'failures': count_by_outcome.get('failure', 0),
+        'timeouts': count_by_outcome.get('timeout', 0),
+        'skipped': count_by_outcome.get('skipped', 0),
+        'success_rate': round(count_by_outcome.get('success', 0) / attempts, 4) if attempts else None,
+        'mean_seconds': round(total / attempts, 3) if attempts else None,
+        'max_seconds': round(maximum, 3)
+    }
+
+
+def stats(period='hour', since=None, until=None, flapping_limit=10):
+    """Success rate, latency, error classes and flapping accounts from the rollups"""
+    until = until or datetime.utcnow()
+    since = since or until - (timedelta(days=1) if period == 'hour' else timedelta(days=30))
+
+    rows = SyncRollup.query.filter(SyncRollup.period == period, SyncRollup.bucket_start >= since,
+                                   SyncRollup.bucket_start < until).order_by(SyncRollup.bucket_start).all()
+    buckets = {}
+    totals = [defaultdict(int), 0.0, 0.0]
+    paths = defaultdict(lambda: [0, 0.0])
+    errors = defaultdict(int)
+    for row in rows:
+        bucket = buckets.setdefault(row.bucket_start, [defaultdict(int), 0.0, 0.0])
+        for aggregate in (bucket, totals):
+            aggregate[0][row.outcome] += row.count
+            if row.outcome != 'skipped':
+                aggregate[1] += row.total_duration
+                aggregate[2] = max(aggregate[2], row.max_duration)
+        if row.outcome != 'skipped':
+            paths[row.path or 'unknown'][0] += row.count
+            paths[row.path or 'unknown'][1] += row.total_duration
+        if row.error_class:
+            errors[row.error_class] += row.count
+
+    flapping = db.session.query(
+        SyncAccountDaily.account_id, ManusAccount.email,
+        db.func.sum(SyncAccountDaily.successes), db.func.sum(SyncAccountDaily.failures),
+        db.func.sum(SyncAccountDaily.flips)
+    ).outerjoin(ManusAccount, ManusAccount.id == SyncAccountDaily.account_id) \
+        .filter(SyncAccountDaily.day >= _day(since), SyncAccountDaily.day < until) \
+        .group_by(SyncAccountDaily.account_id, ManusAccount.email) \
+        .having(db.func.sum(SyncAccountDaily.flips) > 0) \
+        .order_by(db.func.sum(SyncAccountDaily.flips).desc()).limit(flapping_limit).all()
+
+    rolled_up_to = db.session.query(db.func.max(SyncRollup.bucket_start)) \
+        .filter(SyncRollup.period == 'hour').scalar()
+    return {
+        'period': period,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'rolled_up_to': rolled_up_to.isoformat() if rolled_up_to else None,
+        'totals': _summary(*totals),
+        'by_path': {path: {'attempts': count, 'mean_seconds': round(total / count, 3) if count else None}
+                    for path, (count, total) in paths.items()},
+        'error_classes': dict(errors),
+        'series': [dict(_summary(*aggregate), start=bucket_start.isoformat())
+                   for bucket_start, aggregate in buckets.items()],
+        'flapping': [{'account_id': account_id, 'email': email, 'successes': int(successes),
+                      'failures': int(failures), 'flips': int(flips)}
+                     for account_id, email, successes, failures, flips in flapping]
+    }
+
+
+class HistoryWorker:
+    """Rolls up and prunes sync history in the background"""
+
+    def __init__(self, app, interval=None):
+        self.app = app
+        self.interval = ROLLUP_INTERVAL if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sync-history')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                roll_up()
+                prune()
+            except Exception as e:
+                # Another instance may be rolling up the same buckets; the next pass catches up
+                db.session.rollback()
+                print(f"Sync history rollup error: {str(e)}")
+
+    def _run(self):
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
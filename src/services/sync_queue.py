@@ -0,0 +1,274 @@
+import os
+import heapq
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from src.models.account import ManusAccount, db
+from src.services.sync_engine import SyncJob, SyncResult, controlled_sync_job, apply_result
+from src.services.sync_control import get_concurrency_limiter, get_circuit_breaker
+from src.services.retry_policy import record_retry
+from src.services import sync_runs
+from src.services.account_leases import get_account_leases
+from src.services.sync_history import record_event
+from src.services.metrics import phase
+
+DEFAULT_WORKERS = int(os.environ.get('SYNC_QUEUE_WORKERS', '4'))
+# Finished jobs kept around so clients can still look them up
+DEFAULT_HISTORY_SIZE = int(os.environ.get('SYNC_QUEUE_HISTORY', '1000'))
+
+# Lower number runs first
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 10
+
+
+class QueuedSync:
+    """One queued sync for one account"""
+
+    def __init__(self, account_id, priority, source):
+        self.id = uuid.uuid4().hex
+        self.account_id = account_id
+        self.priority = priority
+        self.source = source
+        self.status = 'queued'  # 'queued', 'running', 'done', 'failed', 'skipped'
+        self.message = None
+        self.success = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.run_ids = set()  # SyncRuns waiting for this account
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'account_id': self.account_id,
+            'priority': self.priority,
+            'source': self.source,
+            'status': self.status,
+            'success': self.success,
+            'message': self.message,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'runs': sorted(self.run_ids)
+        }
+
+
+class SyncQueue:
+    """
+    Central queue for account syncs with a fixed number of workers.
+    An account that is already queued or running is not queued twice;
+    a manual request for it instead bumps the existing job's priority.
+    """
+
+    def __init__(self, app, workers=None, history_size=None, service_factory=None):
+        self.app = app
+        self.workers = max(1, workers or DEFAULT_WORKERS)
+        self.history_size = history_size or DEFAULT_HISTORY_SIZE
+        self.service_factory = service_factory
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._active = {}  # account_id -> QueuedSync (queued or running)
+        self._jobs = OrderedDict()  # job id -> QueuedSync
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'sync-queue-{i}')
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        print(f"Sync queue started with {self.workers} workers")
+        return self
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, account_id, priority=PRIORITY_MANUAL, source='manual', run_id=None):
+        """Queue a sync for account_id, or return the job already covering it"""
+        with self._cond:
+            job = self._active.get(account_id)
+            if job is not None:
+                if run_id:
+                    job.run_ids.add(run_id)
+                if job.status == 'queued' and priority < job.priority:
+                    job.priority = priority
+                    heapq.heappush(self._heap, (priority, next(self._counter), job))
+                    self._cond.notify()
+                return job
+
+            job = QueuedSync(account_id, priority, source)
+            if run_id:
+                job.run_ids.add(run_id)
+            self._active[account_id] = job
+            self._remember(job)
+            heapq.heappush(self._heap, (priority, next(self._counter), job))
+            self._cond.notify()
+            return job
+
+    def submit_many(self, account_ids, priority=PRIORITY_MANUAL, source='manual', run_id=None):
+        return [self.submit(account_id, priority, source, run_id) for account_id in account_ids]
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self, status=None):
+        with self._cond:
+            jobs = list(self._jobs.values())
+        if status:
+            jobs = [job for job in jobs if job.status == status]
+        return jobs
+
+    def stats(self):
+        with self._cond:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0, 'skipped': 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            counts['workers'] = self.workers
+        counts['concurrency'] = get_concurrency_limiter().to_dict()
+        counts['circuit'] = get_circuit_breaker().to_dict()
+        return counts
+
+    def _remember(self, job):
+        self._jobs[job.id] = job
+        # Drop the oldest finished jobs once history is full
+        excess = len(self._jobs) - self.history_size
+        if excess > 0:
+            finished = [job_id for job_id, old in self._jobs.items()
+                        if old.status in ('done', 'failed', 'skipped')][:excess]
+            for job_id in finished:
+                self._jobs.pop(job_id)
+
+    def _next_job(self):
+        with self._cond:
+            while self._running:
+                while self._heap:
+                    priority, _, job = heapq.heappop(self._heap)
+                    # Skip stale heap entries left behind by a priority bump
+                    if job.status != 'queued' or priority != job.priority:
+                        continue
+                    job.status = 'running'
+                    job.started_at = datetime.utcnow()
+                    return job
+                self._cond.wait()
+            return None
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                result = self._run(job)
+            except Exception as e:
+                result = SyncResult(job.account_id, None, False, message=f"Sync error: {str(e)}")
+            with self._cond:
+                job.success = result.success
+                job.message = result.message
+                job.status = 'done' if result.success else ('skipped' if result.skipped else 'failed')
+                job.finished_at = datetime.utcnow()
+                self._active.pop(job.account_id, None)
+                run_ids = list(job.run_ids)
+            # A job skipped because the queue is shutting down stays pending for whoever resumes the run
+            if run_ids and (self._running or not result.skipped):
+                self._checkpoint(run_ids, job.account_id, result)
+
+    def _checkpoint(self, run_ids, account_id, result):
+        with self.app.app_context():
+            try:
+                sync_runs.record_items(run_ids, account_id, result)
+            except Exception as e:
+                db.session.rollback()
+                # The item stays pending and is synced again if the run is resumed
+                print(f"Error checkpointing sync runs for account {account_id}: {str(e)}")
+
+    def _wait_for_circuit(self):
+        get_circuit_breaker().wait(1.0)
+        return self._running
+
+    def _run(self, job):
+        with self.app.app_context():
+            account = ManusAccount.query.get(job.account_id)
+            if not account:
+                return SyncResult(job.account_id, None, False, message='Account not found')
+
+            credentials = SyncJob.from_account(account)
+            db.session.rollback()
+
+            leases = get_account_leases(self.app)
+            claimed = self._claim(leases, job.account_id)
+            # Release the connection while the browser works (claim reads after its commit)
+            db.session.rollback()
+            if not claimed:
+                message = 'Skipped: account is being synced by another instance' if self._running \
+                    else 'Skipped: sync queue is stopping'
+                return SyncResult(job.account_id, credentials.email, False, skipped=True, message=message)
+            try:
+                # Queued requests wait out an open circuit instead of failing
+                result = controlled_sync_job(credentials, self.service_factory, wait=self._wait_for_circuit)
+
+                account = ManusAccount.query.get(job.account_id)
+                if account and not result.skipped:
+                    apply_result(account, result)
+                    # Failures are retried by the scheduler on their backoff schedule
+                    record_retry(account, result)
+                    record_event(result)
+                    try:
+                        with phase('db_commit'):
+                            db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        result = SyncResult(job.account_id, credentials.email, False,
+                                            message=f"Error committing changes: {str(e)}")
+                return result
+            finally:
+                self._release_lease(leases, job.account_id)
+
+    def _claim(self, leases, account_id):
+        """Lease account_id; if this process's scheduler holds it, wait for it to finish first"""
+        while True:
+            if account_id in leases.claim([account_id]):
+                return True
+            if not self._running or not leases.held_here(account_id):
+                return False
+            # Don't keep the claim's read transaction open while waiting
+            db.session.rollback()
+            leases.wait_released(account_id, 1.0)
+
+    def _release_lease(self, leases, account_id):
+        try:
+            leases.release([account_id])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error releasing lease on account {account_id}: {str(e)}")
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_sync_queue(app=None):
+    """Process-wide sync queue, started on first use"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if app is None:
+                from flask import current_app
+                app = current_app._get_current_object()
+            _queue = SyncQueue(app).start()
+        return _queue
@@ -0,0 +1,188 @@
+"""
+Persistent sync runs.
+
+Every sync over a set of accounts is recorded as a SyncRun with one
+SyncRunItem per account. Items are checkpointed in the same commit as the
+account rows they describe, so after a crash or restart the run can be
+picked up again and only its still pending accounts are synced.
+
+A run belongs to the process driving it (host:pid:token) and is
+heartbeated at every checkpoint. A run whose owner is gone (dead process
+on this host, or no heartbeat for SYNC_RUN_STALE_MINUTES) counts as
+interrupted and is resumed by the scheduler.
+"""
+import os
+import uuid
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import insert, literal, select
+from src.models.user import db
+from src.models.account import ManusAccount
+from src.models.sync_run import (SyncRun, SyncRunItem, ITEM_PENDING, ITEM_SUCCEEDED,
+                                 ITEM_FAILED, ITEM_SKIPPED)
+
+# Runs without a checkpoint for this long are considered abandoned
+STALE_AFTER = float(os.environ.get('SYNC_RUN_STALE_MINUTES', '30')) * 60
+# Completed runs kept for the API; older ones are deleted with their items
+RUN_HISTORY = int(os.environ.get('SYNC_RUN_HISTORY', '500'))
+
+HOSTNAME = socket.gethostname()
+# The token tells this process apart from an earlier one that had the same pid
+OWNER = f"{HOSTNAME}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def item_state(result):
+    if result.skipped:
+        return ITEM_SKIPPED
+    return ITEM_SUCCEEDED if result.success else ITEM_FAILED
+
+
+def start_run(source, account_ids=None):
+    """Create a running SyncRun with a pending item per account (all when None) and commit it"""
+    now = datetime.utcnow()
+    run = SyncRun(id=uuid.uuid4().hex, source=source, status='running', owner=OWNER,
+                  heartbeat_at=now, started_at=now, resumed=0)
+    db.session.add(run)
+    db.session.flush()
+
+    columns = ['run_id', 'account_id', 'state']
+    if account_ids is None:
+        # Done in SQL so a large table is never loaded into Python
+        db.session.execute(insert(SyncRunItem).from_select(
+            columns, select(literal(run.id), ManusAccount.id, literal(ITEM_PENDING))))
+    elif account_ids:
+        db.session.execute(insert(SyncRunItem), [
+            {'run_id': run.id, 'account_id': account_id, 'state': ITEM_PENDING}
+            for account_id in sorted(set(account_ids))
+        ])
+    run.total = SyncRunItem.query.filter_by(run_id=run.id).count()
+    db.session.commit()
+
+    prune_runs()
+    return run
+
+
+def checkpoint(run_id, account_id, result, now=None):
+    """Mark one account of a run as finished (caller commits)"""
+    now = now or datetime.utcnow()
+    SyncRunItem.query.filter_by(run_id=run_id, account_id=account_id).update(
+        {'state': item_state(result), 'message': result.message, 'finished_at': now},
+        synchronize_session=False)
+
+
+def heartbeat(run_id, now=None):
+    """Record that this process is still driving run_id (caller commits)"""
+    SyncRun.query.filter_by(id=run_id).update(
+        {'owner': OWNER, 'heartbeat_at': now or datetime.utcnow()}, synchronize_session=False)
+
+
+def progress(run_ids):
+    """{run_id: {state: count}} for the given runs"""
+    counts = {run_id: {} for run_id in run_ids}
+    if not counts:
+        return counts
+    rows = db.session.query(SyncRunItem.run_id, SyncRunItem.state, db.func.count(SyncRunItem.id)) \
+        .filter(SyncRunItem.run_id.in_(list(counts))) \
+        .group_by(SyncRunItem.run_id, SyncRunItem.state).all()
+    for run_id, state, count in rows:
+        counts[run_id][state] = count
+    return counts
+
+
+def finish_run(run_id, leftover_message='Not synced'):
+    """
+    Complete a run and store its tallies (commits). Items still pending
+    (accounts deleted meanwhile, or a failed chunk commit) are marked skipped.
+    """
+    now = datetime.utcnow()
+    SyncRunItem.query.filter_by(run_id=run_id, state=ITEM_PENDING).update(
+        {'state': ITEM_SKIPPED, 'message': leftover_message, 'finished_at': now},
+        synchronize_session=False)
+    counts = progress([run_id])[run_id]
+    SyncRun.query.filter_by(id=run_id, status='running').update({
+        'status': 'completed',
+        'finished_at': now,
+        'heartbeat_at': now,
+        'succeeded': counts.get(ITEM_SUCCEEDED, 0),
+        'failed': counts.get(ITEM_FAILED, 0),
+        'skipped': counts.get(ITEM_SKIPPED, 0)
+    }, synchronize_session=False)
+    db.session.commit()
+    return counts
+
+
+def record_items(run_ids, account_id, result):
+    """Checkpoint account_id in each run and complete runs with nothing left pending (commits)"""
+    for run_id in run_ids:
+        checkpoint(run_id, account_id, result)
+        heartbeat(run_id)
+    db.session.commit()
+
+    for run_id in run_ids:
+        if not SyncRunItem.query.filter_by(run_id=run_id, state=ITEM_PENDING).first():
+            finish_run(run_id)
+
+
+def owner_alive(owner):
+    """True/False when it can be told from here, None for another host"""
+    if owner == OWNER:
+        return True
+    try:
+        host, pid, _ = owner.rsplit(':', 2)
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+    if host != HOSTNAME:
+        return None
+    if pid == os.getpid():
+        # Our pid but not our token: an earlier process (typical in containers)
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def is_interrupted(run, now=None):
+    if run.status != 'running':
+        return False
+    alive = owner_alive(run.owner)
+    if alive is not None:
+        return not alive
+    now = now or datetime.utcnow()
+    return run.heartbeat_at is None or now - run.heartbeat_at > timedelta(seconds=STALE_AFTER)
+
+
+def claim_interrupted_runs():
+    """Take over every interrupted run; returns the ids this process now owns (commits)"""
+    claimed = []
+    for run in SyncRun.query.filter_by(status='running').order_by(SyncRun.started_at).all():
+        if not is_interrupted(run):
+            continue
+        # Conditional on the old owner so two schedulers never both claim a run
+        updated = SyncRun.query.filter_by(id=run.id, status='running', owner=run.owner).update({
+            'owner': OWNER,
+            'heartbeat_at': datetime.utcnow(),
+            'resumed': SyncRun.resumed + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if updated:
+            claimed.append(run.id)
+    return claimed
+
+
+def prune_runs(keep=None):
+    """Delete the oldest completed runs beyond keep (commits)"""
+    keep = RUN_HISTORY if keep is None else keep
+    old_ids = [run_id for (run_id,) in db.session.query(SyncRun.id)
+               .filter(SyncRun.status == 'completed')
+               .order_by(SyncRun.started_at.desc()).offset(keep).all()]
+    if not old_ids:
+        return 0
+    SyncRunItem.query.filter(SyncRunItem.run_id.in_(old_ids)).delete(synchronize_session=False)
+    SyncRun.query.filter(SyncRun.id.in_(old_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(old_ids)
@@ -0,0 +1,307 @@
+"""
+Sampled trace bundles for slow or failed syncs.
+
+With SYNC_TRACE=1 a sample of syncs (SYNC_TRACE_SAMPLE) is instrumented.
+If such a sync fails, or takes longer than SYNC_TRACE_SLOW_SECONDS, a zip
+bundle is written to SYNC_TRACE_DIR. The bundle holds:
+
+    trace.json        account, outcome, phase timestamps, CDP performance
+                      metrics and a network timing log of the last page
+    screenshot.jpg    the page as the sync left it
+
+The directory is kept under SYNC_TRACE_MAX_MB, and bundles older than
+SYNC_TRACE_MAX_AGE_HOURS are deleted.
+"""
+import os
+import re
+import json
+import time
+import base64
+import random
+import zipfile
+import threading
+from datetime import datetime
+from src.services import metrics
+
+TRACE_ENABLED = os.environ.get('SYNC_TRACE', '0') == '1'
+SAMPLE_RATE = float(os.environ.get('SYNC_TRACE_SAMPLE', '1.0'))
+SLOW_SECONDS = float(os.environ.get('SYNC_TRACE_SLOW_SECONDS', '20'))
+DEFAULT_TRACE_DIR = os.environ.get(
+    'SYNC_TRACE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'traces')
+)
+DEFAULT_MAX_BYTES = int(float(os.environ.get('SYNC_TRACE_MAX_MB', '200')) * 1024 * 1024)
+DEFAULT_MAX_AGE = float(os.environ.get('SYNC_TRACE_MAX_AGE_HOURS', '72')) * 3600
+
+# Network entries kept per trace, and how much of each URL
+MAX_NETWORK_ENTRIES = 300
+MAX_URL_LENGTH = 300
+SCREENSHOT_QUALITY = 50
+
+TRACE_NAME = re.compile(r'^[\w.-]+\.zip$')
+
+# Resource timing of the current document; used when Chrome's performance log is off
+RESOURCE_TIMING_JS = """
+const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+return entries.slice(0, arguments[0]).map(e => ({
+  url: e.name, type: e.initiatorType || e.entryType, start_ms: Math.round(e.startTime),
+  duration_ms: Math.round(e.duration), bytes: e.transferSize || 0, status: e.responseStatus || null
+}));
+"""
+
+
+def enable_performance_log(options):
+    """Let Chrome record network events for traces (no-op unless tracing is on)"""
+    if TRACE_ENABLED:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    return options
+
+
+def _drain_performance_log(driver):
+    try:
+        return driver.get_log('performance')
+    except Exception:
+        return None
+
+
+def discard_performance_log(driver):
+    """Drop buffered network events; chromedriver keeps them until they are read"""
+    if TRACE_ENABLED:
+        _drain_performance_log(driver)
+
+
+def summarize_network(log_entries, limit=MAX_NETWORK_ENTRIES):
+    """Fold Chrome performance-log Network.* events into one timing row per request"""
+    requests = {}
+    first = None
+    for entry in log_entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get('method', '')
+        if not method.startswith('Network.'):
+            continue
+        params = message.get('params', {})
+        request_id = params.get('requestId')
+        timestamp = params.get('timestamp')
+        if request_id is None or timestamp is None:
+            continue
+
+        if method == 'Network.requestWillBeSent':
+            if len(requests) >= limit and request_id not in requests:
+                continue
+            first = timestamp if first is None else min(first, timestamp)
+            requests[request_id] = {
+                'url': params.get('request', {}).get('url', '')[:MAX_URL_LENGTH],
+                'type': params.get('type'),
+                'start': timestamp, 'end': None, 'status': None, 'bytes': 0, 'error': None
+            }
+            continue
+        row = requests.get(request_id)
+        if row is None:
+            continue
+        if method == 'Network.responseReceived':
+            row['status'] = params.get('response', {}).get('status')
+        elif method == 'Network.loadingFinished':
+            row['end'] = timestamp
+            row['bytes'] = params.get('encodedDataLength', 0)
+        elif method == 'Network.loadingFailed':
+            row['end'] = timestamp
+            row['error'] = params.get('blockedReason') or params.get('errorText')
+
+    rows = []
+    for row in requests.values():
+        start, end = row.pop('start'), row.pop('end')
+        row['start_ms'] = round((start - first) * 1000)
+        row['duration_ms'] = round((end - start) * 1000) if end is not None else None
+        rows.append(row)
+    return sorted(rows, key=lambda row: row['start_ms'])
+
+
+class SyncTrace:
+    """Instrumentation of one sampled sync; saved by finish() only if it was slow or failed"""
+
+    def __init__(self, email, store=None, slow_seconds=None):
+        self.email = email
+        self.store = store or get_trace_store()
+        self.slow_seconds = SLOW_SECONDS if slow_seconds is None else slow_seconds
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.snapshot = None
+        self._screenshot = None
+
+    @classmethod
+    def maybe_start(cls, email, rng=random):
+        """A trace for this sync, or None if tracing is off or it was not sampled"""
+        if not TRACE_ENABLED or rng.random() >= SAMPLE_RATE:
+            return None
+        return cls(email)
+
+    def elapsed(self):
+        return time.perf_counter() - self._started
+
+    def wanted(self, success):
+        return not success or self.elapsed() >= self.slow_seconds
+
+    def attach(self, driver):
+        """Start recording on a freshly leased driver"""
+        # Events from whoever used the pooled driver before are not ours
+        _drain_performance_log(driver)
+        try:
+            driver.execute_cdp_cmd('Performance.enable', {})
+        except Exception:
+            pass
+
+    def capture(self, driver, success):
+        """Snapshot the browser before it is handed back, if this trace will be kept"""
+        if not self.wanted(success):
+            return
+        snapshot = {'url': None, 'performance_metrics': None, 'network': None, 'network_source': None}
+        try:
+            snapshot['url'] = driver.current_url
+        except Exception:
+            pass
+        try:
+            result = driver.execute_cdp_cmd('Performance.getMetrics', {})
+            snapshot['performance_metrics'] = {item['name']: item['value'] for item in result.get('metrics', [])}
+        except Exception:
+            pass
+
+        log_entries = _drain_performance_log(driver)
+        if log_entries is not None:
+            snapshot['network'] = summarize_network(log_entries)
+            snapshot['network_source'] = 'performance_log'
+        else:
+            try:
+                snapshot['network'] = driver.execute_script(RESOURCE_TIMING_JS, MAX_NETWORK_ENTRIES)
+                snapshot['network_source'] = 'resource_timing'
+            except Exception:
+                pass
+
+        try:
+            shot = driver.execute_cdp_cmd('Page.captureScreenshot',
+                                          {'format': 'jpeg', 'quality': SCREENSHOT_QUALITY})
+            self._screenshot = base64.b64decode(shot['data'])
+        except Exception:
+            self._screenshot = None
+        self.snapshot = snapshot
+
+    def finish(self, success, message, path=None):
+        """Write the bundle if the sync failed or was slow; returns its name or None"""
+        elapsed = self.elapsed()
+        if not self.wanted(success):
+            return None
+        fields = metrics.bound_fields()
+        trace = {
+            'account_id': fields.get('account_id'),
+            'email': self.email,
+            'success': success,
+            'message': message,
+            'path': path,
+            'started_at': datetime.utcfromtimestamp(self.started_at).isoformat(),
+            'seconds': round(elapsed, 3),
+            'phases': [{'phase': name, 'start': round(started - self.started_at, 3), 'seconds': round(seconds, 3)}
+                       for name, started, seconds in metrics.recorded_phases()],
+            **(self.snapshot or {})
+        }
+        try:
+            return self.store.save(trace, self._screenshot)
+        except Exception as e:
+            print(f"Failed to save sync trace: {e}")
+            return None
+
+
+class TraceStore:
+    """Trace bundles on disk, bounded by total size and age"""
+
+    def __init__(self, root=None, max_bytes=None, max_age=None):
+        self.root = root or DEFAULT_TRACE_DIR
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+        self._lock = threading.Lock()
+
+    def save(self, trace, screenshot=None):
+        os.makedirs(self.root, exist_ok=True)
+        outcome = 'ok' if trace['success'] else 'failed'
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{trace.get('account_id') or 'na'}-{outcome}.zip"
+        path = os.path.join(self.root, name)
+        with zipfile.ZipFile(path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as bundle:
+            bundle.writestr('trace.json', json.dumps(trace, indent=1))
+            if screenshot:
+                # Already compressed; deflating it again only costs time
+                bundle.writestr('screenshot.jpg', screenshot, compress_type=zipfile.ZIP_STORED)
+        os.replace(path + '.tmp', path)
+        self.prune()
+        return name
+
+    def _entries(self):
+        """(mtime, size, name) of every bundle, oldest first"""
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not TRACE_NAME.match(name):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def prune(self, now=None):
+        """Delete bundles past max_age, then the oldest until under max_bytes"""
+        now = time.time() if now is None else now
+        deleted = 0
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, name in entries:
+                if now - mtime <= self.max_age and total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(os.path.join(self.root, name))
+                except OSError:
+                    pass
+                total -= size
+                deleted += 1
+        return deleted
+
+    def list(self):
+        """Newest first: name, size and when it was written"""
+        return [{'name': name, 'bytes': size,
+                 'created_at': datetime.utcfromtimestamp(mtime).isoformat()}
+                for mtime, size, name in reversed(self._entries())]
+
+    def path(self, name):
+        """Absolute path of a bundle, or None for unknown or malformed names"""
+        if not TRACE_NAME.match(name or ''):
+            return None
+        path = os.path.join(self.root, name)
+        return path if os.path.isfile(path) else None
+
+    def read(self, name, part='trace.json'):
+        path = self.path(name)
+        if path is None:
+            return None
+        try:
+            with zipfile.ZipFile(path) as bundle:
+                return bundle.read(part)
+        except (KeyError, FileNotFoundError):
+            # No such member, or pruned since path() found it
+            return None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_trace_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TraceStore()
+        return _store
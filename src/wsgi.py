@@ -0,0 +1,14 @@
+"""
+WSGI entry point, e.g.
+
+    gunicorn src.wsgi:app
+
+Run it as a single process with threads (see gunicorn.conf.py): the sync
+queue and its job ids, the adaptive limiter, the circuit breaker and the
+live account event stream are held in this process's memory, and are not
+shared between worker processes. The scheduler runs in the same process
+by default, so its status changes reach the event stream too.
+"""
+from src.main import create_app
+
+app = create_app()